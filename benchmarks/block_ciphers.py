@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+from cloup import command, option
+from os import urandom
+from timeit import Timer
+
+from src.logic.ciphers.aes import Aes
+from src.logic.ciphers.des import Des
+from src.logic.file_operations import CHUNK_SIZE
+
+from .suite import DES_KEY, DES_MODES
+
+
+AES_KEYS = {"aes-128": "0123456789abcdef", "aes-256": "0123456789abcdef" * 2}
+AES_MODES = ["ctr", "gcm"]
+
+
+def get_ciphers() -> dict:
+    # binary mode ciphers, as large volumes are encrypted with them
+    ciphers = {
+        f"des-{mode}": Des(None, DES_KEY, None, mode, True) for mode in DES_MODES
+    }
+    for name, key in AES_KEYS.items():
+        for mode in AES_MODES:
+            ciphers[f"{name}-{mode}"] = Aes(None, key, None, mode, True)
+    return ciphers
+
+
+def measure_throughput(func, data_size: int, repeat: int) -> float:
+    seconds = min(Timer(func).repeat(repeat, 1))
+    return data_size / seconds / 1e6
+
+
+@command()
+@option(
+    "--size",
+    type=int,
+    default=64 << 20,
+    show_default=True,
+    help="size of encrypted data in bytes",
+)
+@option("--repeat", type=int, default=3, show_default=True, help="timing repeats")
+def main(size, repeat):
+    data = urandom(size)
+    chunks = [data[i : i + CHUNK_SIZE] for i in range(0, size, CHUNK_SIZE)]
+    ciphers = get_ciphers()
+    results = dict()
+    print(f"{'cipher':<16} {'encrypt MB/s':>13} {'decrypt MB/s':>13}")
+    for name, cipher in ciphers.items():
+        encrypted_chunks = list(cipher.encrypt_chunks(chunks))
+        encrypt = measure_throughput(
+            lambda: sum(map(len, cipher.encrypt_chunks(chunks))), size, repeat
+        )
+        decrypt = measure_throughput(
+            lambda: sum(map(len, cipher.decrypt_chunks(encrypted_chunks))),
+            size,
+            repeat,
+        )
+        results[name] = encrypt
+        print(f"{name:<16} {encrypt:>13.1f} {decrypt:>13.1f}", flush=True)
+    print()
+    for name in ciphers:
+        if name.startswith("aes"):
+            speedup = results[name] / results["des-ctr"]
+            print(f"{name} encrypts {speedup:.1f}x as fast as des-ctr")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+from cloup import command, option
+from random import Random
+from time import perf_counter
+
+from src.logic.ciphers.book import Book
+
+
+WORDS = (
+    "the of and to in a is that for it as was with be by on not he i this "
+    "are or his from at which but have an they you were her she there one "
+    "all we their what so up out if about who get would me when make can "
+    "like time no just him know take people into year your good some could"
+).split()
+
+
+def generate_book(size: int, rng: Random) -> str:
+    rows = []
+    book_len = 0
+    while book_len < size:
+        row = " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 14)))
+        rows.append(row.capitalize() + rng.choice(".,;!?"))
+        book_len += len(rows[-1]) + 1
+    return "\n".join(rows)
+
+
+def scan_decrypt(book: Book, text: str) -> str:
+    # decryption as it was done before the position index existed
+    decrypted_text = ""
+    for symbol in text.split(", "):
+        try:
+            symbol_tuple = tuple(int(i) for i in symbol.split("/"))
+            for letter, positions in book.key.items():
+                if symbol_tuple in positions:
+                    decrypted_text += letter
+        except ValueError:
+            decrypted_text += symbol
+    return decrypted_text.strip()
+
+
+def measure(func, *args):
+    start = perf_counter()
+    result = func(*args)
+    return result, perf_counter() - start
+
+
+@command()
+@option("--book-size", type=int, default=1_000_000, help="key size in chars")
+@option("--text-size", type=int, default=200, help="plaintext size in chars")
+@option("--seed", type=int, default=0, help="corpus generator seed")
+def main(book_size, text_size, seed):
+    rng = Random(seed)
+    key = generate_book(book_size, rng)
+    plaintext = generate_book(text_size, rng)[:text_size].strip()
+
+    book, parse_time = measure(Book, plaintext, key, None, None)
+    ciphertext, encrypt_time = measure(book.encrypt)
+    book.text = ciphertext
+    decrypted_text, decrypt_time = measure(book.decrypt)
+    scanned_text, scan_time = measure(scan_decrypt, book, ciphertext)
+    assert decrypted_text == scanned_text == plaintext
+
+    print(f"key: {len(key)} chars, {len(book.key)} distinct symbols")
+    print(f"text: {len(plaintext)} chars")
+    print(f"key parsing:       {parse_time:.3f}s")
+    print(f"encrypt:           {encrypt_time:.6f}s")
+    print(f"decrypt (indexed): {decrypt_time:.6f}s")
+    print(f"decrypt (scan):    {scan_time:.3f}s")
+    print(f"speedup:           {scan_time / decrypt_time:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
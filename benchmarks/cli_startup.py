@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+from cloup import command, option
+from statistics import median
+from subprocess import DEVNULL, run
+from sys import executable
+from time import perf_counter
+
+from src.logic import load_cipher_registry
+
+
+# startup as it was before the registry: every cipher module is imported
+EAGER_STARTUP = """
+import sys
+from src.logic.ciphers import import_ciphers
+from src import run_cryptosystem_cli
+import_ciphers()
+sys.argv[0] = "cryptosystem.py"
+run_cryptosystem_cli()
+"""
+
+
+def measure_startup(args: list[str], runs: int) -> float:
+    times = []
+    for _ in range(runs):
+        start = perf_counter()
+        run([executable, *args], stdout=DEVNULL, stderr=DEVNULL)
+        times.append(perf_counter() - start)
+    return median(times)
+
+
+@command()
+@option("--runs", type=int, default=10, help="runs of every command")
+def main(runs):
+    # the registry cache is warmed up first, as it is after the first run
+    load_cipher_registry()
+    invocations = [["--help"]] + [
+        [name, "--help"] for name in sorted(load_cipher_registry())
+    ]
+    invocations.append(["caesar", "-e", "-t", "Hello, world!", "-s", "3"])
+    print(f"{'command':<36} {'eager':>9} {'lazy':>9} {'speedup':>8}")
+    for args in invocations:
+        eager_time = measure_startup(["-c", EAGER_STARTUP, *args], runs)
+        lazy_time = measure_startup(["cryptosystem.py", *args], runs)
+        print(
+            f"{' '.join(args):<36} {eager_time * 1000:>7.1f}ms "
+            f"{lazy_time * 1000:>7.1f}ms {eager_time / lazy_time:>7.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
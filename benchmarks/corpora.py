@@ -0,0 +1,52 @@
+from random import Random
+
+
+# every corpus is generated from a seed, so benchmarks need no downloads
+# and give the very same texts on every run
+ASCII_WORDS = (
+    "the of and to in a is that for it as was with be by on not he i this "
+    "are or his from at which but have an they you were her she there one "
+    "all we their what so up out if about who get would me when make can "
+    "like time no just him know take people into year your good some could"
+).split()
+BMP_ALPHABETS = [
+    "абвгдеёжзийклмнопрстуфхцчшщъыьэюя",
+    "αβγδεζηθικλμνξοπρστυφχψω",
+    "的一是不了人我在有他这中大来上国个到说们为子和你地出道也时年",
+]
+ASTRAL_ALPHABETS = [
+    "".join(chr(code) for code in range(0x1F600, 0x1F650)),
+    "".join(chr(code) for code in range(0x10330, 0x1034B)),
+    "".join(chr(code) for code in range(0x1D400, 0x1D434)),
+]
+DISTRIBUTIONS = ["ascii", "bmp", "astral"]
+
+
+def generate_text(distribution: str, size: int, seed: int = 0) -> str:
+    rng = Random(f"{distribution}-{size}-{seed}")
+    if distribution == "ascii":
+        words = ASCII_WORDS
+    elif distribution == "bmp":
+        words = _generate_words(BMP_ALPHABETS, rng)
+    elif distribution == "astral":
+        words = _generate_words(ASTRAL_ALPHABETS, rng)
+    else:
+        raise ValueError(f"unknown distribution '{distribution}'")
+    rows = []
+    text_len = 0
+    while text_len < size:
+        row = " ".join(rng.choice(words) for _ in range(rng.randint(6, 14)))
+        rows.append(row.capitalize() + rng.choice(".,;!?"))
+        text_len += len(rows[-1]) + 1
+    return "\n".join(rows)[:size]
+
+
+def _generate_words(alphabets: list[str], rng: Random) -> list[str]:
+    # astral and bmp texts keep some ascii words, as real texts do
+    words = ASCII_WORDS[:20]
+    for alphabet in alphabets:
+        words += [
+            "".join(rng.choice(alphabet) for _ in range(rng.randint(2, 8)))
+            for _ in range(60)
+        ]
+    return words
@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+from cloup import Choice, Path, command, option
+from contextlib import redirect_stdout
+from io import StringIO
+from json import dump, load
+from os import path
+from platform import platform, python_version
+from statistics import median
+from sys import exit
+from timeit import Timer
+import tracemalloc
+
+from src.logic.ciphers.aes import Aes
+from src.logic.ciphers.book import Book
+from src.logic.ciphers.caesar import Caesar
+from src.logic.ciphers.des import Des
+from src.logic.ciphers.trithemius import Trithemius
+from src.logic.ciphers.xor import XOR
+
+from .corpora import DISTRIBUTIONS, generate_text
+
+
+BASELINE_PATH = path.join(path.dirname(__file__), "baseline.json")
+DES_MODES = ["ecb", "cbc", "cfb", "ofb", "ctr"]
+DES_KEY = "bexy1234"
+AES_KEY = "benchmark aeskey"
+DES_MASK = "be?l?l?d?d?d4"
+MEMORY_SLACK = 1 << 20
+# sub-millisecond cases jitter by tens of microseconds between runs, which is
+# far more than a relative tolerance of them
+TIME_SLACK = 2e-4
+MIN_BATCH_TIME = 0.05
+
+
+def make_des(mode: str):
+    def des(text, key=DES_KEY, mask=None, phrase=None):
+        return Des(text, key, None, mode, False, mask, None, phrase, 1, None)
+
+    return des
+
+
+CIPHERS = {
+    "caesar": lambda text: Caesar(text, 12345, None),
+    "trithemius": lambda text: Trithemius(text, "[1, 2, 3]", None, None),
+    "xor": lambda text: XOR(text, "benchmark key", None, None, 32, 3),
+    "book": None,
+    **{f"des-{mode}": make_des(mode) for mode in DES_MODES},
+    "aes-ctr": lambda text: Aes(text, AES_KEY, None, "ctr"),
+    "aes-gcm": lambda text: Aes(text, AES_KEY, None, "gcm"),
+}
+
+
+def get_cases(cipher_name: str, distribution: str, text: str, seed: int):
+    # every case is a function to time, which constructs the cipher itself
+    # just like a cli call does; its input is prepared once beforehand
+    phrase = text[len(text) // 2 :][:16]
+    if cipher_name == "book":
+        key = generate_text(distribution, 20_000, seed + 1)
+        key += "\n" + "".join(sorted(set(text)))
+        cipher = lambda text: Book(text, key, None, None)
+        encrypted_text = cipher(text).encrypt()
+        return {
+            "encrypt": lambda: cipher(text).encrypt(),
+            "decrypt": lambda: cipher(encrypted_text).decrypt(),
+        }
+    cipher = CIPHERS[cipher_name]
+    encrypted_text = cipher(text).encrypt()
+    cases = {
+        "encrypt": lambda: cipher(text).encrypt(),
+        "decrypt": lambda: cipher(encrypted_text).decrypt(),
+    }
+    if cipher_name == "caesar":
+        cases["bruteforce"] = lambda: Caesar(
+            encrypted_text, None, phrase
+        ).bruteforce()
+    elif cipher_name == "trithemius":
+        cases["bruteforce"] = lambda: Trithemius(
+            encrypted_text, None, None, phrase
+        ).bruteforce()
+    elif cipher_name == "xor":
+        cases["bruteforce"] = lambda: XOR(
+            encrypted_text, None, None, None, 32, 3
+        ).bruteforce()
+    return cases
+
+
+def get_des_bruteforce_cases(seed: int):
+    # keyspace search speed does not depend on text, so it is measured once
+    text = generate_text("ascii", 1_000, seed)
+    cases = dict()
+    for mode in DES_MODES:
+        des = make_des(mode)
+        encrypted_text = des(text).encrypt()
+        cases[f"des-{mode}/bruteforce/ascii/{len(text)}"] = (
+            lambda des=des, encrypted_text=encrypted_text: des(
+                encrypted_text, None, DES_MASK, text[:16]
+            ).bruteforce()
+        )
+    return cases
+
+
+def measure(func, repeat: int) -> tuple[float, int]:
+    # fast cases are run in batches long enough for the timer resolution
+    with redirect_stdout(StringIO()):
+        timer = Timer(func)
+        number = 1
+        while (batch_time := timer.timeit(number)) < MIN_BATCH_TIME:
+            growth = int(MIN_BATCH_TIME / max(batch_time, 1e-6))
+            number *= max(2, min(10, growth))
+        seconds = median([batch_time, *timer.repeat(repeat - 1, number)]) / number
+        tracemalloc.start()
+        func()
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return seconds, peak_memory
+
+
+def compare_results(
+    results: dict, baseline: dict, tolerance: float, memory_tolerance: float
+) -> list[str]:
+    regressions = []
+    for name, result in results.items():
+        if (baseline_result := baseline.get(name)) is None:
+            continue
+        time_limit = baseline_result["seconds"] / (1 - tolerance) + TIME_SLACK
+        if result["seconds"] > time_limit:
+            slowdown = result["seconds"] / baseline_result["seconds"]
+            regressions.append(
+                f"{name}: {slowdown:.2f}x slower "
+                f"({baseline_result['seconds']:.4f}s -> "
+                f"{result['seconds']:.4f}s)"
+            )
+        memory_limit = (
+            baseline_result["peak_memory"] * (1 + memory_tolerance)
+            + MEMORY_SLACK
+        )
+        if result["peak_memory"] > memory_limit:
+            regressions.append(
+                f"{name}: peak memory grew "
+                f"{baseline_result['peak_memory'] / 2**20:.1f} MB -> "
+                f"{result['peak_memory'] / 2**20:.1f} MB"
+            )
+    return regressions
+
+
+@command()
+@option(
+    "--sizes",
+    type=int,
+    multiple=True,
+    default=[1_000, 10_000, 100_000, 1_000_000],
+    show_default=True,
+    help="input sizes in chars, can be given several times",
+)
+@option(
+    "--distributions",
+    type=Choice(DISTRIBUTIONS),
+    multiple=True,
+    default=DISTRIBUTIONS,
+    show_default=True,
+    help="character distributions of generated inputs",
+)
+@option(
+    "--ciphers",
+    type=Choice(list(CIPHERS)),
+    multiple=True,
+    default=list(CIPHERS),
+    help="ciphers to benchmark, all of them by default",
+)
+@option(
+    "--repeat",
+    type=int,
+    default=5,
+    show_default=True,
+    help="timing repeats, the median of which is taken",
+)
+@option("--seed", type=int, default=0, show_default=True, help="corpora seed")
+@option("--out", type=Path(), help="write results to JSON file")
+@option(
+    "--baseline",
+    type=Path(),
+    default=BASELINE_PATH,
+    show_default=True,
+    help="JSON results to compare with, if the file exists",
+)
+@option("--save-baseline", is_flag=True, help="write results as new baseline")
+@option(
+    "--tolerance",
+    type=float,
+    default=0.25,
+    show_default=True,
+    help="""
+        allowed relative slowdown (plus 0.2 ms) before a case counts as
+        regression
+    """,
+)
+@option(
+    "--memory-tolerance",
+    type=float,
+    default=0.25,
+    show_default=True,
+    help="allowed relative peak memory growth (plus 1 MB)",
+)
+def main(
+    sizes,
+    distributions,
+    ciphers,
+    repeat,
+    seed,
+    out,
+    baseline,
+    save_baseline,
+    tolerance,
+    memory_tolerance,
+):
+    cases = dict()
+    for distribution in distributions:
+        for size in sizes:
+            text = generate_text(distribution, size, seed)
+            for cipher_name in ciphers:
+                cipher_cases = get_cases(cipher_name, distribution, text, seed)
+                for method, func in cipher_cases.items():
+                    cases[f"{cipher_name}/{method}/{distribution}/{size}"] = (
+                        func,
+                        len(text.encode("utf-8")),
+                    )
+    for name, func in get_des_bruteforce_cases(seed).items():
+        if name.split("/")[0] in ciphers:
+            cases[name] = func, None
+
+    results = dict()
+    print(f"{'case':<40} {'time':>10} {'MB/s':>9} {'peak MB':>9}")
+    for name, (func, text_bytes) in cases.items():
+        seconds, peak_memory = measure(func, repeat)
+        results[name] = {"seconds": seconds, "peak_memory": peak_memory}
+        throughput = ""
+        if text_bytes is not None:
+            results[name]["mb_per_sec"] = text_bytes / seconds / 1e6
+            throughput = f"{results[name]['mb_per_sec']:.2f}"
+        print(
+            f"{name:<40} {seconds * 1000:>8.2f}ms {throughput:>9} "
+            f"{peak_memory / 2**20:>9.2f}",
+            flush=True,
+        )
+
+    report = {
+        "python": python_version(),
+        "platform": platform(),
+        "seed": seed,
+        "results": results,
+    }
+    if out:
+        with open(out, "w", encoding="utf-8") as f:
+            dump(report, f, indent=2)
+    if save_baseline:
+        with open(baseline, "w", encoding="utf-8") as f:
+            dump(report, f, indent=2)
+        print(f"Baseline was written to {baseline}")
+    elif path.exists(baseline):
+        with open(baseline, encoding="utf-8") as f:
+            baseline_results = load(f)["results"]
+        regressions = compare_results(
+            results, baseline_results, tolerance, memory_tolerance
+        )
+        if regressions:
+            print(f"\nREGRESSIONS against {baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            exit(1)
+        print(f"\nNo regressions against {baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
+from .errors import CryptosystemError
 from .options_parser import OptionsParser
 from .ciphers import BaseCipher
 from .ciphers import import_ciphers
+from .cipher_registry import import_cipher, load_cipher_registry
@@ -0,0 +1,145 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stdout
+from glob import glob, has_magic
+from io import StringIO
+from os import cpu_count, makedirs, path, walk
+from time import perf_counter
+
+from .errors import CryptosystemError
+from .file_operations import read_file_chunks, read_text_chunks
+from .output_sinks import AtomicFileSink
+
+
+def find_batch_files(pattern: str) -> list[tuple[str, str]]:
+    # files are given with paths relative to the directory or to the part
+    # of the glob before its first wildcard, which are kept in output
+    if path.isdir(pattern):
+        return [
+            (file_path, path.relpath(file_path, pattern))
+            for directory, _, file_names in walk(pattern)
+            for file_path in sorted(
+                path.join(directory, file_name) for file_name in file_names
+            )
+        ]
+    root = path.dirname(pattern)
+    while has_magic(root):
+        root = path.dirname(root)
+    return [
+        (file_path, path.relpath(file_path, root or "."))
+        for file_path in sorted(glob(pattern, recursive=True))
+        if path.isfile(file_path)
+    ]
+
+
+def is_up_to_date(file_path: str, out_file_path: str) -> bool:
+    return (
+        path.exists(out_file_path)
+        and path.getmtime(out_file_path) >= path.getmtime(file_path)
+    )
+
+
+class BatchRun:
+    def __init__(
+        self,
+        cipher,
+        cipher_method_name: str,
+        cipher_options: dict,
+        pattern: str,
+        out_dir: str,
+        jobs: int | None,
+        errors: str,
+    ):
+        self.cipher = cipher
+        self.cipher_method_name = cipher_method_name
+        self.cipher_options = cipher_options
+        self.pattern = pattern
+        self.out_dir = out_dir
+        self.jobs = jobs or cpu_count() or 1
+        self.errors = errors
+
+    def run(self) -> str:
+        start_time = perf_counter()
+        # options are checked once here, so that workers do not fail on them
+        self.cipher(None, **self.cipher_options)
+        files = []
+        skipped = 0
+        for file_path, relative_path in find_batch_files(self.pattern):
+            out_file_path = path.join(self.out_dir, relative_path)
+            if is_up_to_date(file_path, out_file_path):
+                skipped += 1
+            else:
+                files.append((file_path, out_file_path))
+        processed = failed = replaced = bytes_count = 0
+        if files:
+            with ProcessPoolExecutor(
+                min(self.jobs, len(files)),
+                initializer=_init_worker,
+                initargs=(
+                    self.cipher,
+                    self.cipher_method_name,
+                    self.cipher_options,
+                    self.errors,
+                ),
+            ) as executor:
+                futures = [
+                    executor.submit(_process_file, *file_paths)
+                    for file_paths in files
+                ]
+                for future in as_completed(futures):
+                    file_path, size, file_replaced, error = future.result()
+                    if error is not None:
+                        failed += 1
+                        print(f"Sorry, but '{file_path}' failed: {error}")
+                        continue
+                    processed += 1
+                    replaced += file_replaced
+                    bytes_count += size
+        elapsed = perf_counter() - start_time
+        summary = (
+            f"{processed} files were {self.cipher_method_name}ed "
+            f"({skipped} up to date, {failed} failed): "
+            f"{bytes_count / 1e6:.1f} MB in {elapsed:.2f}s "
+            f"({bytes_count / 1e6 / max(elapsed, 1e-9):.1f} MB/s, "
+            f"jobs: {min(self.jobs, max(len(files), 1))})."
+        )
+        if replaced:
+            summary += (
+                f"\nDue to UnicodeEncodeException {replaced} symbols wich "
+                f"Python can't encode were handled with '{self.errors}' "
+                f"strategy, so they might not be properly decoded."
+            )
+        return summary
+
+
+_worker = dict()
+
+
+def _init_worker(cipher, cipher_method_name, cipher_options, errors):
+    # the cipher is constructed once per process and makes a new stream
+    # for every file
+    _worker.update(
+        cipher=cipher(None, **cipher_options),
+        method=f"{cipher_method_name}_chunks",
+        binary=cipher_options.get("binary", False),
+        errors=errors,
+    )
+
+
+def _process_file(
+    file_path: str, out_file_path: str
+) -> tuple[str, int, int, str | None]:
+    messages = StringIO()
+    try:
+        with redirect_stdout(messages):
+            if _worker["binary"]:
+                chunks = read_file_chunks(file_path)
+            else:
+                chunks = read_text_chunks(file_path)
+            makedirs(path.dirname(out_file_path) or ".", exist_ok=True)
+            cipher_method = getattr(_worker["cipher"], _worker["method"])
+            with AtomicFileSink(out_file_path, errors=_worker["errors"]) as sink:
+                sink.write_chunks(cipher_method(chunks))
+    except (CryptosystemError, SystemExit, OSError, ValueError) as e:
+        error = messages.getvalue().strip() or str(e) or type(e).__name__
+        return file_path, 0, 0, error
+    return file_path, path.getsize(file_path), sink.replaced, None
@@ -0,0 +1,129 @@
+from concurrent.futures import ProcessPoolExecutor
+from os import cpu_count, path, walk
+
+from .book_key_index import BookKeyIndex, is_key_index
+from .ngram_scorer import NgramScorer, TopCandidates
+
+
+# books which fit all ciphertext positions are scored on decryption of the
+# first SAMPLE_SIZE of them
+SAMPLE_SIZE = 2000
+
+
+def parse_positions(text: str) -> list[tuple[int, int]]:
+    # tokens which are not positions are kept as they are by decryption,
+    # so they tell nothing about the book
+    positions = []
+    for token in text.strip().split(", "):
+        try:
+            row_num, column_num = map(int, token.split("/"))
+        except ValueError:
+            continue
+        positions.append((row_num, column_num))
+    return positions
+
+
+def find_books(corpus_path: str) -> list[str]:
+    if not path.isdir(corpus_path):
+        raise ValueError(f"no '{corpus_path}' directory was found")
+    return sorted(
+        path.join(dir_path, file_name)
+        for dir_path, _, file_names in walk(corpus_path)
+        for file_name in file_names
+    )
+
+
+class BookRows:
+    # (row, column) -> symbol table of a book, the same as the one Book
+    # parses from its key
+    def __init__(self, text: str):
+        self._rows = [f"{row}\n" for row in text.strip().split("\n")]
+
+    def get(self, position: tuple[int, int], default=None):
+        row_num, column_num = position
+        if not 0 <= row_num < len(self._rows):
+            return default
+        row = self._rows[row_num]
+        if not 0 <= column_num < len(row):
+            return default
+        return row[column_num]
+
+
+def load_book(file_path: str):
+    # books may be either plain texts or key indexes compiled from them
+    if is_key_index(file_path):
+        return BookKeyIndex(file_path).position_symbols
+    with open(file_path, encoding="utf-8", newline="") as f:
+        return BookRows(f.read())
+
+
+class CorpusSearch:
+    def __init__(
+        self,
+        corpus_path: str,
+        text: str,
+        top: int,
+        workers: int | None,
+    ):
+        self.books = find_books(corpus_path)
+        self.positions = parse_positions(text)
+        if not self.positions:
+            raise ValueError("text has no positions of book symbols")
+        self.top = top
+        self.workers = workers or cpu_count() or 1
+
+    def run(self) -> list[tuple[str, int, float | None, str | None]]:
+        # books are ranked by the number of positions they fit, which stops
+        # at the first position out of them, and then by the sample score
+        best = TopCandidates(self.top)
+        if self.workers == 1 or len(self.books) < 2:
+            _init_worker(self.positions)
+            results = map(_check_book, self.books)
+            self._rank_results(best, results)
+        else:
+            with ProcessPoolExecutor(
+                min(self.workers, len(self.books)),
+                initializer=_init_worker,
+                initargs=(self.positions,),
+            ) as executor:
+                chunksize = max(1, len(self.books) // (4 * self.workers))
+                results = executor.map(_check_book, self.books, chunksize=chunksize)
+                self._rank_results(best, results)
+        return [
+            (book, fitted, score, language)
+            for (fitted, _), (book, score, language) in best.get_sorted()
+        ]
+
+    def _rank_results(self, best: TopCandidates, results):
+        for book, fitted, scored in results:
+            if fitted is None:
+                continue
+            score, language = scored or (None, None)
+            rank_score = float("-inf") if score is None else score
+            best.push((fitted, rank_score), (book, score, language))
+
+
+_worker = dict()
+
+
+def _init_worker(positions: list[tuple[int, int]]):
+    _worker.update(positions=positions, scorer=NgramScorer())
+
+
+def _check_book(
+    file_path: str,
+) -> tuple[str, int | None, tuple[float, str] | None]:
+    try:
+        book = load_book(file_path)
+    except (OSError, UnicodeDecodeError, ValueError):
+        # files which are not books are skipped
+        return file_path, None, None
+    symbols = []
+    for position in _worker["positions"]:
+        symbol = book.get(position)
+        if symbol is None:
+            # no text encrypted with this book could have such position
+            return file_path, len(symbols), None
+        symbols.append(symbol)
+    sample = "".join(symbols[:SAMPLE_SIZE])
+    return file_path, len(symbols), _worker["scorer"].score(sample)
@@ -0,0 +1,132 @@
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from mmap import mmap, ACCESS_READ
+from struct import Struct
+from sys import byteorder
+
+# file layout, every array is made of native uint32 values:
+#   header | row_offsets[rows + 1] | cells[cells] | symbols[symbols]
+#   | symbol_offsets[symbols + 1] | positions[2 * cells]
+# cells are key symbols in row-major order, positions are (row, column)
+# pairs grouped by symbol in the order of sorted symbols
+MAGIC = b"CSBOOKIX"
+HEADER = Struct("=8s1s3xIII")
+BYTE_ORDER = b"<" if byteorder == "little" else b">"
+
+
+def compile_key_index(key: str, file_path: str):
+    key_list = key.strip().split("\n")
+    row_offsets = array("I", [0])
+    cells = array("I")
+    symbol_positions = defaultdict(lambda: array("I"))
+    for row_num, row in enumerate(key_list):
+        row = f"{row}\n"
+        cells.frombytes(row.encode("utf-32-le", "surrogatepass"))
+        row_offsets.append(len(cells))
+        for column_num, symbol in enumerate(row):
+            symbol_positions[symbol].extend((row_num, column_num))
+    if byteorder != "little":
+        cells.byteswap()
+    symbols = sorted(symbol_positions, key=ord)
+    symbol_offsets = array("I", [0])
+    positions = array("I")
+    for symbol in symbols:
+        positions.extend(symbol_positions[symbol])
+        symbol_offsets.append(len(positions) // 2)
+    with open(file_path, "wb") as f:
+        f.write(
+            HEADER.pack(
+                MAGIC, BYTE_ORDER, len(key_list), len(cells), len(symbols)
+            )
+        )
+        for values in (
+            row_offsets,
+            cells,
+            array("I", map(ord, symbols)),
+            symbol_offsets,
+            positions,
+        ):
+            values.tofile(f)
+
+
+def is_key_index(file_path: str) -> bool:
+    with open(file_path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+class BookKeyIndex:
+    def __init__(self, file_path: str):
+        with open(file_path, "rb") as f:
+            self._buffer = mmap(f.fileno(), 0, access=ACCESS_READ)
+        if len(self._buffer) < HEADER.size:
+            raise ValueError("file is too short to be a key index")
+        magic, byte_order, rows, cells, symbols = HEADER.unpack_from(
+            self._buffer
+        )
+        if magic != MAGIC:
+            raise ValueError("file is not a key index")
+        if byte_order != BYTE_ORDER:
+            raise ValueError("key index was compiled with other byte order")
+        values = memoryview(self._buffer)[HEADER.size :].cast("I")
+        if len(values) != rows + 3 * cells + 2 * symbols + 2:
+            raise ValueError("key index is truncated")
+        sizes = (rows + 1, cells, symbols, symbols + 1, 2 * cells)
+        arrays = []
+        for size in sizes:
+            arrays.append(values[:size])
+            values = values[size:]
+        row_offsets, cells, symbols, symbol_offsets, positions = arrays
+        self.symbol_positions = SymbolPositions(
+            symbols, symbol_offsets, positions
+        )
+        self.position_symbols = PositionSymbols(row_offsets, cells)
+
+
+class SymbolPositions:
+    def __init__(self, symbols, symbol_offsets, positions):
+        self._symbols = symbols
+        self._symbol_offsets = symbol_offsets
+        self._positions = positions
+
+    def get(self, symbol: str, default=None):
+        code_point = ord(symbol)
+        i = bisect_left(self._symbols, code_point)
+        if i == len(self._symbols) or self._symbols[i] != code_point:
+            return default
+        start, end = self._symbol_offsets[i], self._symbol_offsets[i + 1]
+        return Positions(self._positions[2 * start : 2 * end])
+
+    def __len__(self):
+        return len(self._symbols)
+
+
+class Positions:
+    def __init__(self, positions):
+        self._positions = positions
+
+    def __getitem__(self, i: int) -> tuple[int, int]:
+        return tuple(self._positions[2 * i : 2 * i + 2])
+
+    def __len__(self):
+        return len(self._positions) // 2
+
+
+class PositionSymbols:
+    def __init__(self, row_offsets, cells):
+        self._row_offsets = row_offsets
+        self._cells = cells
+
+    def get(self, position: tuple[int, ...], default=None):
+        if len(position) != 2:
+            return default
+        row_num, column_num = position
+        if not 0 <= row_num < len(self._row_offsets) - 1 or column_num < 0:
+            return default
+        cell = self._row_offsets[row_num] + column_num
+        if cell >= self._row_offsets[row_num + 1]:
+            return default
+        return chr(self._cells[cell])
+
+    def __len__(self):
+        return len(self._cells)
@@ -0,0 +1,32 @@
+# Byte mode packs bytes-like data into one big integer as well, with 8-bit
+# lanes. Low 7 bits of every byte are added without carrying into the next
+# byte and top bits are added by xor, which gives byte sums modulo 256.
+LOW_BITS = 0x7F
+HIGH_BIT = 0x80
+
+
+def repeat_bytes(pattern: bytes, start: int, count: int) -> bytes:
+    # pattern repeated from its position start, as a key is from the
+    # position of a chunk in the whole data
+    start %= len(pattern)
+    pattern = pattern[start:] + pattern[:start]
+    return (pattern * -(-count // len(pattern)))[:count]
+
+
+def add_bytes(data, shifts: bytes) -> bytes:
+    count = len(data)
+    x = int.from_bytes(data, "little")
+    y = int.from_bytes(shifts, "little")
+    low = int.from_bytes(bytes([LOW_BITS]) * count, "little")
+    high = int.from_bytes(bytes([HIGH_BIT]) * count, "little")
+    added = ((x & low) + (y & low)) ^ ((x ^ y) & high)
+    return added.to_bytes(count, "little")
+
+
+def xor_bytes(data, key_stream: bytes) -> bytes:
+    xored = int.from_bytes(data, "little") ^ int.from_bytes(key_stream, "little")
+    return xored.to_bytes(len(data), "little")
+
+
+def negate_bytes(data: bytes) -> bytes:
+    return bytes(-byte % 256 for byte in data)
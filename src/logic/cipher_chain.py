@@ -0,0 +1,78 @@
+from codecs import getincrementaldecoder
+from typing import Callable, Iterable, Iterator
+
+from .cipher_streams import CipherStream
+from .errors import CryptosystemError
+
+
+class CipherChain:
+    # stages are keyed ciphers in the order of encryption, every stage pulls
+    # chunks of the previous one, so nothing is written between them, and
+    # text stages pass str chunks to each other without encoding them; text
+    # is encoded for binary stages with surrogates, which shifted symbols
+    # may be, so that decryption gets back exactly the same text
+    def __init__(self, stages: list[tuple[str, object]]):
+        for (previous_name, previous), (name, cipher) in zip(stages, stages[1:]):
+            if is_binary(previous) and not is_binary(cipher):
+                raise CryptosystemError(
+                    f"Text stage {name} can't follow binary stage "
+                    f"{previous_name}, as its output is not a text"
+                )
+        self.stages = stages
+
+    def get_binary_ends(self, decrypt: bool = False) -> tuple[bool, bool]:
+        # whether input and output of the whole chain are bytes
+        first, last = is_binary(self.stages[0][1]), is_binary(self.stages[-1][1])
+        return (last, first) if decrypt else (first, last)
+
+    def process_chunks(
+        self,
+        chunks: Iterable,
+        decrypt: bool = False,
+        wrap_stage: Callable[[str, Iterator], Iterator] | None = None,
+    ) -> Iterator:
+        # decryption undoes the stages from the last one
+        stages = self.stages[::-1] if decrypt else self.stages
+        binary = is_binary(stages[0][1])
+        for name, cipher in stages:
+            if is_binary(cipher) and not binary:
+                chunks = (chunk.encode("utf-8", "surrogatepass") for chunk in chunks)
+            elif binary and not is_binary(cipher):
+                chunks = decode_chunks(chunks)
+            binary = is_binary(cipher)
+            if decrypt:
+                chunks = cipher.decrypt_chunks(chunks)
+            else:
+                chunks = cipher.encrypt_chunks(chunks)
+            chunks = check_stage_chunks(chunks, name)
+            if wrap_stage is not None:
+                chunks = wrap_stage(name, chunks)
+        return chunks
+
+
+def is_binary(cipher) -> bool:
+    return getattr(cipher, "binary", False)
+
+
+def decode_chunks(chunks: Iterable[bytes]) -> Iterator[str]:
+    decoder = getincrementaldecoder("utf-8")("surrogatepass")
+    return CipherStream(
+        decoder.decode, lambda: decoder.decode(b"", final=True)
+    ).process(chunks)
+
+
+def check_stage_chunks(chunks: Iterator, stage_name: str) -> Iterator:
+    # ciphers which encode text by themselves, like text mode DES, can't
+    # encode surrogates made by other stages
+    try:
+        yield from chunks
+    except UnicodeDecodeError:
+        raise CryptosystemError(
+            f"Input of text stage {stage_name} is not a text, so it was not "
+            f"encrypted by this chain"
+        )
+    except UnicodeEncodeError as e:
+        raise CryptosystemError(
+            f"Stage {stage_name} can't encode symbol {e.object[e.start]!r} "
+            f"with {e.encoding}, make it binary with -B"
+        )
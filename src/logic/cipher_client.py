@@ -0,0 +1,49 @@
+import socket
+from json import dumps, loads
+
+from .errors import CryptosystemError
+
+
+# requests and responses are JSON objects, one per line; the line limit
+# bounds memory the server spends on a single request
+MAX_MESSAGE_SIZE = 1 << 28
+LOCAL_HOSTS = ("localhost", "127.0.0.1", "::1")
+
+
+def parse_address(address: str) -> tuple[str, str | tuple[str, int]]:
+    # HOST:PORT is a tcp address, anything else is a unix socket path
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit():
+        host = host.strip("[]")
+        if host not in LOCAL_HOSTS:
+            raise CryptosystemError(
+                "Server has no authentication, so it can only be used "
+                "on localhost"
+            )
+        return "tcp", (host, int(port))
+    return "unix", address
+
+
+def request_server(address: str, request: dict) -> dict:
+    family, target = parse_address(address)
+    try:
+        if family == "unix":
+            connection = socket.socket(socket.AF_UNIX)
+            connection.connect(target)
+        else:
+            connection = socket.create_connection(target)
+        with connection, connection.makefile("rwb") as stream:
+            stream.write(dumps(request).encode("utf-8") + b"\n")
+            stream.flush()
+            response = stream.readline()
+    except OSError as e:
+        raise CryptosystemError(
+            f"Sorry, but server at '{address}' can't be reached: "
+            f"{e.strerror or e}"
+        )
+    if not response:
+        raise CryptosystemError(f"Server at '{address}' closed the connection")
+    response = loads(response)
+    if "error" in response:
+        raise CryptosystemError(response["error"])
+    return response
@@ -0,0 +1,120 @@
+from importlib import import_module
+from json import dump, load
+from os import environ, makedirs, path, replace, scandir
+from zlib import crc32
+
+
+# commands of every cipher module are found by parsing its source, so no
+# cipher has to be imported until its command is chosen; parsed modules
+# are cached on disk and parsed again only when their mtime or size change
+CIPHERS_PATH = path.join(path.dirname(path.abspath(__file__)), "ciphers")
+REGISTRY_VERSION = 2
+
+
+def get_registry_cache_path() -> str:
+    cache_home = environ.get("XDG_CACHE_HOME") or path.join(
+        path.expanduser("~"), ".cache"
+    )
+    # every checkout of the package gets its own registry
+    checkout_hash = crc32(CIPHERS_PATH.encode("utf-8"))
+    return path.join(
+        cache_home, "cryptosystem", f"registry-{checkout_hash:08x}.json"
+    )
+
+
+def load_cipher_registry() -> dict[str, dict]:
+    cache_path = get_registry_cache_path()
+    cached_modules = _load_cached_modules(cache_path)
+    modules = dict()
+    for entry in scandir(CIPHERS_PATH):
+        if not entry.name.endswith(".py") or entry.name.startswith("_"):
+            continue
+        module_name = entry.name[:-3]
+        stat = entry.stat()
+        cached_module = cached_modules.get(module_name)
+        if cached_module and cached_module["mtime_ns"] == stat.st_mtime_ns and (
+            cached_module["size"] == stat.st_size
+        ):
+            modules[module_name] = cached_module
+        else:
+            modules[module_name] = {
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "commands": _parse_cipher_module(entry.path, module_name),
+            }
+    if modules != cached_modules:
+        _save_cached_modules(cache_path, modules)
+    return {
+        command_name: command
+        for module in modules.values()
+        for command_name, command in module["commands"].items()
+    }
+
+
+def import_cipher(registry_entry: dict):
+    module = import_module(f".ciphers.{registry_entry['module']}", __package__)
+    return getattr(module, registry_entry["class"])
+
+
+def _load_cached_modules(cache_path: str) -> dict[str, dict]:
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            registry = load(f)
+    except (OSError, ValueError):
+        return dict()
+    if not isinstance(registry, dict) or (
+        registry.get("version") != REGISTRY_VERSION
+    ):
+        return dict()
+    return registry.get("modules", dict())
+
+
+def _save_cached_modules(cache_path: str, modules: dict[str, dict]):
+    # the cache is only an optimization, so it is fine not to write it
+    from tempfile import mkstemp
+
+    try:
+        makedirs(path.dirname(cache_path), exist_ok=True)
+        file_descriptor, temp_path = mkstemp(
+            dir=path.dirname(cache_path), suffix=".tmp"
+        )
+        with open(file_descriptor, "w", encoding="utf-8") as f:
+            dump({"version": REGISTRY_VERSION, "modules": modules}, f)
+        replace(temp_path, cache_path)
+    except OSError:
+        pass
+
+
+def _parse_cipher_module(file_path: str, module_name: str) -> dict[str, dict]:
+    # ast is imported only when the cache is outdated
+    import ast
+
+    with open(file_path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), file_path)
+    commands = dict()
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and any(
+            isinstance(base, ast.Name) and base.id == "BaseCipher"
+            for base in node.bases
+        ):
+            commands[node.name.lower()] = {
+                "module": module_name,
+                "class": node.name,
+            }
+    for node in tree.body:
+        call = node.value if isinstance(node, ast.Expr) else None
+        if not isinstance(call, ast.Call) or not isinstance(call.func, ast.Name):
+            continue
+        if not call.args or not isinstance(call.args[0], ast.Name):
+            continue
+        command_name = call.args[0].id.lower()
+        if command_name not in commands:
+            continue
+        if call.func.id == "add_cipher_command" and len(call.args) > 1:
+            name = ast.literal_eval(call.args[1])
+            commands[f"{command_name}-{name}"] = {
+                "module": module_name,
+                "class": commands[command_name]["class"],
+            }
+    return commands
+
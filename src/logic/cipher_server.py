@@ -0,0 +1,287 @@
+import asyncio
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from json import dumps, loads
+from os import cpu_count, path, remove, stat
+from signal import SIG_IGN, SIGINT, SIGTERM, signal
+import socket
+from stat import S_ISSOCK
+from time import perf_counter
+
+from .cipher_client import MAX_MESSAGE_SIZE, parse_address
+from .cipher_registry import import_cipher, load_cipher_registry
+from .errors import CryptosystemError
+
+
+# requests with more text than this are processed by the worker pool, as
+# bruteforce ones are, so that they do not hold back the event loop
+HEAVY_PAYLOAD_SIZE = 1 << 20
+CIPHER_CACHE_SIZE = 128
+LATENCY_SAMPLE_SIZE = 10_000
+CIPHER_METHODS = ("encrypt", "decrypt", "bruteforce")
+# the server has no authentication, so files named by options are only read
+# from its key directory and no file is written for a client
+READ_PATH_OPTIONS = ("key_from_file", "key_index", "corpus")
+WRITE_PATH_OPTIONS = ("checkpoint",)
+
+
+@lru_cache(maxsize=None)
+def get_cipher_class(cipher_name: str):
+    entry = load_cipher_registry().get(cipher_name)
+    # commands like book-compile-key are not ciphers
+    if entry is None or entry["class"].lower() != cipher_name:
+        raise CryptosystemError(f"There is no '{cipher_name}' cipher")
+    return import_cipher(entry)
+
+
+@lru_cache(maxsize=CIPHER_CACHE_SIZE)
+def get_keyed_cipher(cipher_name: str, options_json: str):
+    # options come as canonical JSON, so equal keys share one instance
+    return new_cipher(cipher_name, None, loads(options_json))
+
+
+def new_cipher(cipher_name: str, text: str | None, options: dict):
+    if options.get("binary"):
+        raise CryptosystemError("Binary mode can't be used with server")
+    try:
+        return get_cipher_class(cipher_name)(text, **options)
+    except (TypeError, KeyError) as e:
+        raise CryptosystemError(f"Invalid {cipher_name} options: {e}")
+
+
+def resolve_path_options(options: dict, key_dir: str | None) -> dict:
+    options = dict(options)
+    for name in WRITE_PATH_OPTIONS:
+        if options.get(name) is not None:
+            raise CryptosystemError(f"Option {name} can't be used with server")
+    for name in READ_PATH_OPTIONS:
+        if (file_path := options.get(name)) is None:
+            continue
+        if key_dir is None:
+            raise CryptosystemError(
+                f"Option {name} can't be used with server started without "
+                f"--key-dir"
+            )
+        if not isinstance(file_path, str):
+            raise CryptosystemError(f"Option {name} must be a path")
+        # symlinks are resolved too, so none of them leads out of key_dir
+        key_dir = path.realpath(key_dir)
+        resolved_path = path.realpath(path.join(key_dir, file_path))
+        if path.commonpath([resolved_path, key_dir]) != key_dir:
+            raise CryptosystemError(
+                f"Option {name} must be a path in the key directory of server"
+            )
+        options[name] = resolved_path
+    return options
+
+
+def process_request(
+    cipher_name: str, options_json: str, method: str, texts: list[str]
+) -> list[str]:
+    # this runs both in the server process and in pool workers, every one
+    # of them keeps its own cache of keyed ciphers
+    if method == "bruteforce":
+        options = loads(options_json)
+        return [
+            new_cipher(cipher_name, text, options).bruteforce() for text in texts
+        ]
+    cipher = get_keyed_cipher(cipher_name, options_json)
+    return list(cipher.map(texts, decrypt=method == "decrypt"))
+
+
+def _init_worker():
+    # ctrl+c in a terminal reaches workers too, but the server stops them
+    signal(SIGINT, SIG_IGN)
+
+
+class ServerStats:
+    def __init__(self):
+        self.start_time = perf_counter()
+        self.requests = 0
+        self.pooled_requests = 0
+        self.errors = 0
+        self.texts = 0
+        self.input_chars = 0
+        self.output_chars = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLE_SIZE)
+
+    def add_request(
+        self, latency: float, texts: list[str], results: list[str], pooled: bool
+    ):
+        self.requests += 1
+        self.pooled_requests += pooled
+        self.texts += len(texts)
+        self.input_chars += sum(map(len, texts))
+        self.output_chars += sum(map(len, results))
+        self.latencies.append(latency)
+
+    def add_error(self, latency: float):
+        self.requests += 1
+        self.errors += 1
+        self.latencies.append(latency)
+
+    def get_report(self) -> dict:
+        uptime = perf_counter() - self.start_time
+        latencies = sorted(self.latencies)
+
+        def get_percentile(share: float) -> float:
+            if not latencies:
+                return 0
+            return latencies[min(int(share * len(latencies)), len(latencies) - 1)]
+
+        cache_info = get_keyed_cipher.cache_info()
+        return {
+            "uptime_seconds": uptime,
+            "requests": self.requests,
+            "pooled_requests": self.pooled_requests,
+            "errors": self.errors,
+            "texts": self.texts,
+            "requests_per_second": self.requests / uptime,
+            "texts_per_second": self.texts / uptime,
+            "input_chars_per_second": self.input_chars / uptime,
+            "output_chars_per_second": self.output_chars / uptime,
+            # latencies of the last LATENCY_SAMPLE_SIZE requests
+            "latency_ms": {
+                "mean": sum(latencies) / max(len(latencies), 1) * 1000,
+                "p50": get_percentile(0.5) * 1000,
+                "p95": get_percentile(0.95) * 1000,
+                "p99": get_percentile(0.99) * 1000,
+                "max": (latencies[-1] if latencies else 0) * 1000,
+            },
+            "cipher_cache": {
+                "hits": cache_info.hits,
+                "misses": cache_info.misses,
+                "size": cache_info.currsize,
+                "max_size": cache_info.maxsize,
+            },
+        }
+
+
+class CipherServer:
+    def __init__(
+        self, address: str, jobs: int | None, key_dir: str | None = None
+    ):
+        self.address = address
+        self.jobs = jobs or cpu_count() or 1
+        self.key_dir = key_dir
+        self.stats = ServerStats()
+        self.pool = None
+
+    def run(self):
+        family, target = parse_address(self.address)
+        if family == "unix":
+            self._remove_stale_socket(target)
+        try:
+            asyncio.run(self.serve(family, target))
+        finally:
+            if family == "unix" and path.exists(target):
+                remove(target)
+
+    async def serve(self, family: str, target: str | tuple[str, int]):
+        with ProcessPoolExecutor(self.jobs, initializer=_init_worker) as self.pool:
+            if family == "unix":
+                server = await asyncio.start_unix_server(
+                    self.handle_connection, target, limit=MAX_MESSAGE_SIZE
+                )
+            else:
+                server = await asyncio.start_server(
+                    self.handle_connection, *target, limit=MAX_MESSAGE_SIZE
+                )
+            # the server stops on interrupt or termination, so that its
+            # socket is removed and its counters can be shown
+            stopped = asyncio.Event()
+            loop = asyncio.get_running_loop()
+            for signal_number in (SIGINT, SIGTERM):
+                loop.add_signal_handler(signal_number, stopped.set)
+            print(f"Server is listening on {self.address}", flush=True)
+            async with server:
+                await stopped.wait()
+
+    async def handle_connection(self, reader, writer):
+        # requests of one connection are answered in order
+        try:
+            while line := await reader.readline():
+                response = await self.handle_request(line)
+                writer.write(dumps(response).encode("utf-8") + b"\n")
+                await writer.drain()
+        except (ConnectionError, ValueError):
+            # ValueError is raised for lines longer than MAX_MESSAGE_SIZE
+            pass
+        finally:
+            writer.close()
+
+    async def handle_request(self, line: bytes) -> dict:
+        start_time = perf_counter()
+        request_id = None
+        try:
+            request = self._parse_request(line)
+            request_id = request.get("id")
+            if request["method"] == "stats":
+                return {"id": request_id, "stats": self.stats.get_report()}
+            options = resolve_path_options(
+                request.get("options", dict()), self.key_dir
+            )
+            args = (
+                request["cipher"],
+                dumps(options, sort_keys=True),
+                request["method"],
+                request["texts"],
+            )
+            pooled = request["method"] == "bruteforce" or (
+                sum(map(len, request["texts"])) > HEAVY_PAYLOAD_SIZE
+            )
+            if pooled:
+                loop = asyncio.get_running_loop()
+                results = await loop.run_in_executor(
+                    self.pool, process_request, *args
+                )
+            else:
+                results = process_request(*args)
+        except Exception as e:
+            # a failed request must not break the connection or the server
+            self.stats.add_error(perf_counter() - start_time)
+            if not isinstance(e, CryptosystemError):
+                e = f"Request failed with {type(e).__name__}: {e}"
+            return {"id": request_id, "error": str(e)}
+        self.stats.add_request(
+            perf_counter() - start_time, request["texts"], results, pooled
+        )
+        return {"id": request_id, "results": results}
+
+    def _parse_request(self, line: bytes) -> dict:
+        try:
+            request = loads(line)
+        except ValueError:
+            raise CryptosystemError("Request is not valid JSON")
+        if not isinstance(request, dict):
+            raise CryptosystemError("Request must be a JSON object")
+        method = request.get("method")
+        if method == "stats":
+            return request
+        if method not in CIPHER_METHODS:
+            raise CryptosystemError(
+                f"Method must be one of: {', '.join(CIPHER_METHODS)}, stats"
+            )
+        texts = request.get("texts")
+        if not isinstance(texts, list) or not all(
+            isinstance(text, str) for text in texts
+        ):
+            raise CryptosystemError("Texts must be a list of strings")
+        if not isinstance(request.get("options", dict()), dict):
+            raise CryptosystemError("Options must be a JSON object")
+        if not isinstance(request.get("cipher"), str):
+            raise CryptosystemError("Cipher name must be given")
+        return request
+
+    def _remove_stale_socket(self, socket_path: str):
+        # a socket left by a server which was killed can't be listened on
+        if not path.exists(socket_path) or not S_ISSOCK(stat(socket_path).st_mode):
+            return
+        with socket.socket(socket.AF_UNIX) as probe:
+            try:
+                probe.connect(socket_path)
+            except ConnectionRefusedError:
+                remove(socket_path)
+                return
+        raise CryptosystemError(f"Another server is listening on {socket_path}")
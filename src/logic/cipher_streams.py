@@ -0,0 +1,84 @@
+from typing import Any, Callable, Iterable, Iterator
+
+
+class CipherStream:
+    # every fed chunk is processed right away, the state needed across chunk
+    # boundaries is kept by the stream itself and flushed by finalize
+    def __init__(
+        self,
+        process_chunk: Callable[[Any], Any],
+        flush: Callable[[], Any] | None = None,
+    ):
+        self.process_chunk = process_chunk
+        self.flush = flush
+
+    def update(self, chunk: Any) -> Any:
+        return self.process_chunk(chunk)
+
+    def finalize(self) -> Any:
+        return self.flush() if self.flush is not None else ""
+
+    def process(self, chunks: Iterable[Any]) -> Iterator[Any]:
+        for chunk in chunks:
+            if output := self.update(chunk):
+                yield output
+        if output := self.finalize():
+            yield output
+
+
+class BufferedStream(CipherStream):
+    # for ciphers which need the whole text, chunks are only collected
+    def __init__(self, process_text: Callable[[Any], Any]):
+        self.process_text = process_text
+        self.chunks = []
+
+    def update(self, chunk: Any) -> Any:
+        self.chunks.append(chunk)
+        return chunk[:0]
+
+    def finalize(self) -> Any:
+        if not self.chunks:
+            return self.process_text("")
+        text = self.chunks[0][:0].join(self.chunks)
+        self.chunks = []
+        return self.process_text(text)
+
+
+class StreamChain(CipherStream):
+    def __init__(self, *streams: CipherStream):
+        self.streams = streams
+
+    def update(self, chunk: Any) -> Any:
+        for stream in self.streams:
+            chunk = stream.update(chunk)
+        return chunk
+
+    def finalize(self) -> Any:
+        output = None
+        for stream in self.streams:
+            if output:
+                output = stream.update(output) + stream.finalize()
+            else:
+                output = stream.finalize()
+        return output
+
+
+class TextStripper(CipherStream):
+    # the same as str.strip of the whole text, trailing whitespace is held
+    # back until some other symbol follows it
+    def __init__(self):
+        self.started = False
+        self.whitespace = ""
+
+    def update(self, chunk: str) -> str:
+        if not self.started:
+            chunk = chunk.lstrip()
+            self.started = bool(chunk)
+        text = self.whitespace + chunk
+        stripped_text = text.rstrip()
+        self.whitespace = text[len(stripped_text) :]
+        return stripped_text
+
+    def finalize(self) -> str:
+        self.whitespace = ""
+        return ""
@@ -0,0 +1,223 @@
+from cloup import option, Path, Choice
+from cloup.constraints import constraint, require_one, accept_none, If
+from enum import Enum
+from codecs import getincrementaldecoder
+from struct import Struct
+from typing import Iterable, Iterator
+from Crypto.Cipher import AES
+
+from .base_cipher import BaseCipher
+from .des import Base64Decoder, Base64Encoder
+from ..cipher_streams import CipherStream, StreamChain
+from ..file_operations import load_text_from_file
+from ...ui import add_cipher_options
+
+
+class aes_modes(Enum):
+    ctr = AES.MODE_CTR
+    gcm = AES.MODE_GCM
+
+
+# encrypted data starts with magic, mode, nonce length and the nonce itself,
+# ciphertext and GCM tag follow; text mode output is this data in base64
+HEADER = Struct("=4sBB")
+MAGIC = b"CSAE"
+KEY_SIZES = (16, 32)
+TAG_SIZE = 16
+
+
+class Aes(BaseCipher):
+    # pycryptodome uses AES-NI instructions for both modes where the CPU
+    # has them, and CLMUL ones for GCM authentication
+    def __init__(
+        self,
+        text: str = None,
+        key: str = None,
+        key_from_file: str = None,
+        mode: str = "gcm",
+        binary: bool = False,
+    ):
+        if key_from_file is not None:
+            key = load_text_from_file(key_from_file)
+        if key is not None:
+            self.key = self._validate_key(key)
+        self.text = text
+        self.mode = aes_modes[mode]
+        self.binary = binary
+
+    def encrypt(self) -> str | Iterator[bytes]:
+        if self.binary:
+            return self.encrypt_chunks(self.text)
+        return "".join(self.encrypt_chunks([self.text]))
+
+    def decrypt(self) -> str | Iterator[bytes]:
+        if self.binary:
+            return self.decrypt_chunks(self.text)
+        return "".join(self.decrypt_chunks([self.text]))
+
+    def encryptor(self) -> CipherStream:
+        # every text gets a new random nonce
+        cipher = AES.new(self.key, self.mode.value)
+        header = HEADER.pack(MAGIC, self.mode.value, len(cipher.nonce))
+        encryptor = AesEncryptor(
+            cipher, self.mode == aes_modes.gcm, header + cipher.nonce
+        )
+        if self.binary:
+            return encryptor
+        return StreamChain(
+            CipherStream(lambda chunk: chunk.encode("utf-8")),
+            encryptor,
+            Base64Encoder(),
+        )
+
+    def decryptor(self) -> CipherStream:
+        decryptor = AesDecryptor(self)
+        if self.binary:
+            return decryptor
+        decoder = getincrementaldecoder("utf-8")()
+        return StreamChain(
+            Base64Decoder(),
+            decryptor,
+            CipherStream(decoder.decode, lambda: decoder.decode(b"", final=True)),
+        )
+
+    def decrypt_chunks(self, chunks: Iterable) -> Iterator:
+        try:
+            yield from super().decrypt_chunks(chunks)
+        except ValueError:
+            # wrong key, mode or changed data, GCM can't tell them apart
+            target = "file" if self.binary else "text"
+            self._terminate(
+                f"This {target} was not encrypted using this key and "
+                f"{self.mode.name.upper()} mode, or it was changed"
+            )
+
+    def bruteforce(self) -> str:
+        return "AES keys are too long to be bruteforced :c"
+
+    def _read_header(self, data: bytes) -> tuple[bytes, bytes] | None:
+        if len(data) < HEADER.size:
+            return None
+        magic, mode, nonce_len = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("data was not encrypted with AES")
+        if mode != self.mode.value:
+            raise ValueError("data was encrypted using other mode")
+        nonce_end = HEADER.size + nonce_len
+        if len(data) < nonce_end:
+            return None
+        return data[HEADER.size : nonce_end], data[nonce_end:]
+
+    def _validate_key(self, key: str) -> bytes:
+        byte_key = key.encode("utf-8")
+        key_len = len(byte_key)
+        if key_len not in KEY_SIZES:
+            self._terminate(
+                f"Key must be 16 or 32 bytes length (but {key_len} was given)"
+            )
+        return byte_key
+
+
+class AesEncryptor(CipherStream):
+    # both modes are stream ones, so chunks of any size are encrypted as is
+    def __init__(self, cipher, tagged: bool, header: bytes):
+        self.cipher = cipher
+        self.tagged = tagged
+        self.header = header
+
+    def update(self, chunk: bytes) -> bytes:
+        output = self.header + self.cipher.encrypt(chunk)
+        self.header = b""
+        return output
+
+    def finalize(self) -> bytes:
+        output = self.header
+        self.header = b""
+        if self.tagged:
+            output += self.cipher.digest()
+        return output
+
+
+class AesDecryptor(CipherStream):
+    # cipher is created as soon as the header with nonce is read, GCM tag
+    # is the last TAG_SIZE bytes, so they are always kept back; GCM output
+    # is kept back too until the tag is verified, so that no changed data
+    # is written
+    def __init__(self, aes: Aes):
+        self.aes = aes
+        self.tagged = aes.mode == aes_modes.gcm
+        self.header = b""
+        self.cipher = None
+        self.tail = b""
+        self.chunks = []
+
+    def update(self, chunk: bytes) -> bytes:
+        if self.cipher is None:
+            self.header += chunk
+            if (header := self.aes._read_header(self.header)) is None:
+                return b""
+            nonce, chunk = header
+            self.cipher = AES.new(self.aes.key, self.aes.mode.value, nonce=nonce)
+        if not self.tagged:
+            return self.cipher.decrypt(chunk)
+        data = self.tail + chunk
+        self.tail = data[-TAG_SIZE:]
+        self.chunks.append(self.cipher.decrypt(data[:-TAG_SIZE]))
+        return b""
+
+    def finalize(self) -> bytes:
+        if self.cipher is None:
+            raise ValueError("data was not encrypted with AES")
+        if not self.tagged:
+            return b""
+        self.cipher.verify(self.tail)
+        output = b"".join(self.chunks)
+        self.chunks = []
+        return output
+
+
+add_cipher_options(
+    Aes,
+    option(
+        "-k",
+        "--key",
+        type=str,
+        help="""
+            any 16-byte (AES-128) or 32-byte (AES-256) string
+        """,
+    ),
+    option(
+        "-K",
+        "--key-from-file",
+        type=Path(),
+        help="""
+            the same as --key option, but loads key from file.
+        """,
+    ),
+    constraint(require_one, ("bruteforce", "key", "key_from_file")),
+    option(
+        "-m",
+        "--mode",
+        type=Choice(["ctr", "gcm"]),
+        required=True,
+        help="""
+            one of AES cipher modes:
+
+            \b
+            - CTR
+            - GCM, which also checks that decrypted data
+              was not changed, so it is held in memory and
+              written only after the check
+        """,
+    ),
+    option(
+        "-B",
+        "--binary",
+        is_flag=True,
+        help="""
+            process input as raw bytes read and written by chunks instead of
+            text, encrypted data is written as raw bytes with a small header
+        """,
+    ),
+    constraint(If("bruteforce", then=accept_none), ["binary"]),
+)
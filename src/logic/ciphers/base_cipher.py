@@ -1,7 +1,17 @@
 from abc import ABC, abstractmethod
+from typing import Iterable, Iterator
+
+from ..cipher_streams import BufferedStream, CipherStream
+from ..errors import CryptosystemError
 
 
 class BaseCipher(ABC):
+    # a cipher is keyed once in its constructor and then encrypts or
+    # decrypts any number of texts, every text gets its own stream
+
+    # methods whose results depend only on options and text may be cached
+    cached_methods = ()
+
     @abstractmethod
     def encrypt(self):
         ...
@@ -13,3 +23,35 @@ class BaseCipher(ABC):
     @abstractmethod
     def bruteforce(self):
         ...
+
+    def encryptor(self) -> CipherStream:
+        return BufferedStream(self._process_text(self.encrypt))
+
+    def decryptor(self) -> CipherStream:
+        return BufferedStream(self._process_text(self.decrypt))
+
+    def encrypt_chunks(self, chunks: Iterable) -> Iterator:
+        return self.encryptor().process(chunks)
+
+    def decrypt_chunks(self, chunks: Iterable) -> Iterator:
+        return self.decryptor().process(chunks)
+
+    def encrypt_text(self, text: str | bytes) -> str | bytes:
+        return text[:0].join(self.encrypt_chunks([text]))
+
+    def decrypt_text(self, text: str | bytes) -> str | bytes:
+        return text[:0].join(self.decrypt_chunks([text]))
+
+    def map(self, texts: Iterable, decrypt: bool = False) -> Iterator:
+        process_text = self.decrypt_text if decrypt else self.encrypt_text
+        return map(process_text, texts)
+
+    def _process_text(self, cipher_method):
+        def process_text(text):
+            self.text = text
+            return cipher_method()
+
+        return process_text
+
+    def _terminate(self, message):
+        raise CryptosystemError(message)
@@ -1,27 +1,80 @@
 from cloup import option, Path
-from cloup.constraints import constraint, require_one
+from cloup.constraints import (
+    constraint,
+    require_one,
+    require_all,
+    accept_none,
+    If,
+    IsSet,
+)
 from random import choice
 
 from .base_cipher import BaseCipher
-from ..file_operations import load_text_from_file
-from ...ui import add_cipher_options
+from ..cipher_streams import CipherStream, StreamChain, TextStripper
+from ..book_corpus import CorpusSearch
+from ..book_key_index import BookKeyIndex, compile_key_index, is_key_index
+from ..errors import CryptosystemError
+from ..file_operations import (
+    load_text_from_file,
+    get_file_digest,
+    confirm_file_rewrite,
+)
+from ..result_cache import get_active_cache, get_cache_key, get_data_digest
+from ...ui import add_cipher_options, add_cipher_command
 
 
 class Book(BaseCipher):
-    def __init__(self, text: str, key: str, key_from_file: str):
+    def __init__(
+        self,
+        text: str = None,
+        key: str = None,
+        key_from_file: str = None,
+        key_index: str = None,
+        corpus: str = None,
+        top: int = 3,
+        workers: int = None,
+    ):
         self.unicode_size = int(0x110000)
         self.text = text
-        if key_from_file is not None:
-            key = load_text_from_file(key_from_file)
-        key = self._validate_key(key)
-        self.key = self._parse_key(key)
+        self.corpus = corpus
+        self.top = top
+        self.workers = workers
+        if key_index is not None:
+            self.key, self.key_index = self._load_key_index(key_index)
+            return
+        if key is not None or key_from_file is not None:
+            self.key, self.key_index = self._load_key(key, key_from_file)
 
     def encrypt(self) -> str | None:
-        encrypted_text = ""
+        return "".join(self.encrypt_chunks([self.text]))
+
+    def decrypt(self) -> str:
+        return "".join(self.decrypt_chunks([self.text]))
+
+    def encryptor(self) -> CipherStream:
+        return CipherStream(self._encrypt_symbols)
+
+    def decryptor(self) -> CipherStream:
+        # the last symbol of a chunk may be continued by the next chunk
+        tail = ""
+
+        def decrypt_chunk(chunk: str) -> str:
+            nonlocal tail
+            *symbols, tail = (tail + chunk).split(", ")
+            return self._decrypt_symbols(symbols)
+
+        return StreamChain(
+            CipherStream(decrypt_chunk, lambda: self._decrypt_symbols([tail])),
+            TextStripper(),
+        )
+
+    def _encrypt_symbols(self, symbols: str) -> str:
+        encrypted_symbols = []
         invalid_symbols = []
-        for symbol in self.text:
+        for symbol in symbols:
             if positions := self.key.get(symbol):
-                encrypted_text += f"{'/'.join(str(i) for i in choice(positions))}, "
+                row_num, column_num = choice(positions)
+                encrypted_symbols.append(f"{row_num}/{column_num}, ")
             else:
                 invalid_symbols.append(symbol)
         if invalid_symbols:
@@ -29,40 +82,107 @@ class Book(BaseCipher):
                 f"Cannot operate symbols which are not in key: "
                 f"{', '.join(invalid_symbols).strip()}"
             )
-        else:
-            return encrypted_text
+        return "".join(encrypted_symbols)
 
-    def decrypt(self) -> str:
-        decrypted_text = ""
-        for symbol in self.text.split(", "):
+    def _decrypt_symbols(self, symbols: list[str]) -> str:
+        decrypted_symbols = []
+        for symbol in symbols:
             try:
                 symbol_tuple = tuple(int(i) for i in symbol.split("/"))
-                for letter, positions in self.key.items():
-                    if symbol_tuple in positions:
-                        decrypted_text += letter
+                decrypted_symbols.append(self.key_index.get(symbol_tuple, ""))
             except ValueError:
-                decrypted_text += symbol
-        return decrypted_text.strip()
+                decrypted_symbols.append(symbol)
+        return "".join(decrypted_symbols)
 
     def bruteforce(self) -> str:
-        return "NotImplemented"
+        try:
+            search = CorpusSearch(self.corpus, self.text, self.top, self.workers)
+            books = search.run()
+        except ValueError as e:
+            self._terminate(f"Cannot bruteforce this text: {e}")
+        positions_count = len(search.positions)
+        if not books or books[0][1] < positions_count:
+            return "\n".join(
+                [f"There is no book in '{self.corpus}' which fits the text :c"]
+                + [
+                    f"Book '{book}' fits only {fitted} of {positions_count} "
+                    f"positions."
+                    for book, fitted, _, _ in books
+                    if fitted
+                ]
+            )
+        return "\n\n".join(
+            self._describe_decryption(book, score, language)
+            for book, fitted, score, language in books
+            if fitted == positions_count
+        )
+
+    def _describe_decryption(
+        self, book: str, score: float | None, language: str | None
+    ) -> str:
+        if is_key_index(book):
+            decrypted_text = Book(self.text, key_index=book).decrypt()
+        else:
+            decrypted_text = Book(self.text, key_from_file=book).decrypt()
+        # decryptions without any letters have no score
+        details = f" (language: {language}, score {score:.3f})" if score else ""
+        return (
+            f"Text was decrypted with book '{book}'{details}. Result is:\n"
+            f"{decrypted_text}"
+        )
 
     def _validate_key(self, key: str) -> str:
         if len(key) == 0:
             self._terminate("Key must contain at least one symbol")
         return key
 
-    def _parse_key(self, key: str) -> dict[str, tuple[tuple[int, int]]]:
+    def _load_key(self, key: str | None, key_from_file: str | None):
+        # parsed keys are cached as compiled key indexes, which are found by
+        # digest of the key, so cached key files are not even decoded
+        cache = get_active_cache()
+        if cache is not None:
+            if key_from_file is not None:
+                key_digest = get_file_digest(key_from_file)
+            else:
+                key_digest = get_data_digest(key)
+            cache_key = get_cache_key("book", "key", key_digest)
+            if (index_path := cache.get_path(cache_key)) is not None:
+                try:
+                    key_index = BookKeyIndex(index_path)
+                except (OSError, ValueError):
+                    # evicted or written by other version of the cache
+                    key_index = None
+                if key_index is not None:
+                    return key_index.symbol_positions, key_index.position_symbols
+        if key_from_file is not None:
+            key = load_text_from_file(key_from_file)
+        key = self._validate_key(key)
+        if cache is not None:
+            cache.store(
+                cache_key, lambda file_path: compile_key_index(key, file_path)
+            )
+        return self._parse_key(key)
+
+    def _parse_key(
+        self, key: str
+    ) -> tuple[dict[str, tuple[tuple[int, int]]], dict[tuple[int, int], str]]:
         key_list = key.strip().split("\n")
         key_dict = {symbol: [] for row in key_list for symbol in f"{row}\n"}
+        key_index = {}
         for row_num, row in enumerate(key_list):
             for column_num, symbol in enumerate(f"{row}\n"):
                 key_dict[symbol].append((row_num, column_num))
-        return {k: tuple(v) for k, v in key_dict.items()}
+                key_index[row_num, column_num] = symbol
+        return {k: tuple(v) for k, v in key_dict.items()}, key_index
 
-    def _terminate(self, message):
-        print(message)
-        exit(0)
+    def _load_key_index(self, file_path: str):
+        try:
+            key_index = BookKeyIndex(file_path)
+        except FileNotFoundError:
+            self._terminate(f"Sorry, but no '{file_path}' file was found :c")
+        except ValueError as e:
+            self._terminate(f"Cannot load key index '{file_path}': {e}")
+        return key_index.symbol_positions, key_index.position_symbols
 
 
 add_cipher_options(
@@ -84,5 +204,71 @@ add_cipher_options(
             the same as --key option, but loads key from file.
         """,
     ),
-    constraint(require_one, ("bruteforce", "key", "key_from_file")),
+    option(
+        "-i",
+        "--key-index",
+        type=Path(),
+        help="""
+            the same as --key option, but loads key from file compiled with
+            book-compile-key command.
+        """,
+    ),
+    constraint(
+        require_one, ("bruteforce", "key", "key_from_file", "key_index")
+    ),
+    option(
+        "-c",
+        "--corpus",
+        type=Path(),
+        help="""
+            directory of possible key files, plain or compiled with
+            book-compile-key command, to find the key of the text among
+        """,
+    ),
+    option(
+        "-n",
+        "--top",
+        type=int,
+        default=3,
+        show_default=True,
+        help="number of the most probable key files to show in bruteforce",
+    ),
+    option(
+        "-w",
+        "--workers",
+        type=int,
+        help="number of bruteforce processes, all CPUs by default",
+    ),
+    constraint(If("bruteforce", then=require_all), ["corpus"]),
+    constraint(If(~IsSet("bruteforce"), then=accept_none), ["corpus", "workers"]),
+)
+
+
+def compile_key(key_from_file: str, out: str):
+    key = load_text_from_file(key_from_file)
+    if len(key) == 0:
+        raise CryptosystemError("Key must contain at least one symbol")
+    confirm_file_rewrite(out)
+    compile_key_index(key, out)
+    print("Key index was successfully written.")
+
+
+add_cipher_command(
+    Book,
+    "compile-key",
+    compile_key,
+    option(
+        "-K",
+        "--key-from-file",
+        type=Path(),
+        required=True,
+        help="key file to compile",
+    ),
+    option(
+        "-o",
+        "--out",
+        type=Path(),
+        required=True,
+        help="write compiled key index to file",
+    ),
 )
@@ -1,20 +1,52 @@
-from cloup import option
+from cloup import option, Choice
+from collections import Counter
+from functools import lru_cache
 from cloup.constraints import (
     constraint,
     require_one,
     accept_none,
-    require_all,
     If,
+    IsSet,
 )
 
 from .base_cipher import BaseCipher
+from ..cipher_streams import CipherStream
+from ..code_point_lanes import (
+    add_lanes,
+    code_point_differences,
+    lanes_to_text,
+    repeat_lane,
+    text_to_lanes,
+)
+from ..ngram_scorer import LANGUAGES, NgramScorer
 from ...ui import add_cipher_options
 
 
+# without a phrase shifts are guessed on a sample of the text, the most
+# common sample symbols being taken for the most common language symbols
+SAMPLE_SIZE = 10_000
+SAMPLE_SYMBOLS = 4
+COMMON_SYMBOLS = 8
+
+
 class Caesar(BaseCipher):
-    def __init__(self, text, shift, phrase):
+    cached_methods = ("bruteforce",)
+
+    def __init__(
+        self,
+        text=None,
+        shift=None,
+        phrase=None,
+        top=3,
+        language=(),
+        binary=False,
+    ):
         self.text = text
         self.unicode_size = int(0x110000)
+        self.binary = binary
+        self.top = top
+        self.languages = language
+        self.phrase = None
         if shift is not None:
             self.shift = shift
             self._validate_shift()
@@ -23,28 +55,69 @@ class Caesar(BaseCipher):
             self._validate_phrase()
 
     def encrypt(self):
-        self._create_letter_shifts()
-        return "".join(
-            chr(ord(letter) + self._letter_shifts[letter])
-            for letter in self.text
-        )
+        return self._shift_text(self.text, self.shift)
 
     def decrypt(self):
-        self.shift *= -1
-        return self.encrypt()
+        return self._shift_text(self.text, -self.shift)
+
+    def encryptor(self):
+        return CipherStream(lambda chunk: self._shift_text(chunk, self.shift))
+
+    def decryptor(self):
+        return CipherStream(lambda chunk: self._shift_text(chunk, -self.shift))
 
     def bruteforce(self):
-        for self.shift in range(1, self.unicode_size):
-            decrypted_text = self.decrypt()
-            if self.phrase in decrypted_text:
-                positive_shift = self.shift * -1
-                negative_shift = -(self.unicode_size - positive_shift)
-                return (
-                    f"Text was successfully decrypted with shift "
-                    f"{positive_shift} or {negative_shift}. Result is:\n"
-                    f"{decrypted_text}"
-                )
-        return "There is no such phrase in any possible text decryption :c"
+        if self.phrase is None:
+            return self._bruteforce_by_scores()
+        shifts = self._find_phrase_shifts()
+        if not shifts:
+            return "There is no such phrase in any possible text decryption :c"
+        return "\n\n".join(self._describe_decryption(shift) for shift in shifts)
+
+    def _bruteforce_by_scores(self):
+        scorer = NgramScorer(self.languages)
+        sample = self.text[:SAMPLE_SIZE]
+        shifts = {
+            (ord(symbol) - ord(plain_symbol)) % self.unicode_size
+            for symbol, _ in Counter(sample).most_common(SAMPLE_SYMBOLS)
+            for plain_symbol in scorer.common_symbols(COMMON_SYMBOLS)
+        }
+        shifts.discard(0)
+        candidates = scorer.rank(
+            ((shift, self._shift_text(sample, -shift)) for shift in shifts),
+            self.top,
+        )
+        if not candidates:
+            return "Text is too short to guess the shift :c"
+        return "\n\n".join(
+            self._describe_decryption(
+                shift, f" (language: {language}, score {score:.3f})"
+            )
+            for score, (language, shift) in candidates
+        )
+
+    def _find_phrase_shifts(self):
+        # Caesar keeps differences between neighbouring code points, so the
+        # phrase differences can be searched directly in the text differences
+        text_diffs = code_point_differences(self.text)
+        phrase_diffs = code_point_differences(self.phrase)
+        phrase_start = ord(self.phrase[0])
+        shifts = set()
+        position = text_diffs.find(phrase_diffs)
+        while position != -1:
+            shifts.add((ord(self.text[position]) - phrase_start) % self.unicode_size)
+            position = text_diffs.find(phrase_diffs, position + 1)
+        shifts.discard(0)
+        return sorted(shifts)
+
+    def _describe_decryption(self, shift, details=""):
+        decrypted_text = self._shift_text(self.text, -shift)
+        negative_shift = -(self.unicode_size - shift)
+        return (
+            f"Text was successfully decrypted with shift "
+            f"{shift} or {negative_shift}{details}. Result is:\n"
+            f"{decrypted_text}"
+        )
 
     def _validate_shift(self):
         if self.shift == 0:
@@ -55,34 +128,38 @@ class Caesar(BaseCipher):
     def _validate_phrase(self):
         if len(self.phrase) == 0:
             self._terminate("Where did the phrase go?")
+        elif self.text is None:
+            self._terminate("Phrase can only be used with the text to bruteforce")
         elif len(self.phrase) > len(self.text):
             self._terminate(
                 "Are you seriously trying to use a phrase from text "
                 "longer than text itself?"
             )
 
-    def _terminate(self, message):
-        print(message)
-        exit(0)
+    def _shift_text(self, text, shift):
+        if self.binary:
+            # bytes-like data is shifted modulo 256 without decoding it
+            return bytes(text).translate(_get_byte_shift_table(shift % 256))
+        shift %= self.unicode_size
+        if text.isascii():
+            return text.translate(_get_ascii_shift_table(shift))
+        return self._shift_code_points(text, shift)
+
+    def _shift_code_points(self, text, shift):
+        text_len = len(text)
+        ones = repeat_lane(1, text_len)
+        shifted_lanes = add_lanes(text_to_lanes(text), ones * shift, ones)
+        return lanes_to_text(shifted_lanes, text_len)
+
+
+@lru_cache
+def _get_ascii_shift_table(shift):
+    return {code: (code + shift) % 0x110000 for code in range(128)}
 
-    def _create_letter_shifts(self):
-        self._letter_shifts = {
-            letter: self._validate_shift_for_letter(letter)
-            for letter in self.text
-        }
 
-    def _validate_shift_for_letter(self, letter):
-        shifted_letter_unicode = ord(letter) + self.shift
-        if shifted_letter_unicode < 0:
-            unicodes_in_shift = (
-                abs(shifted_letter_unicode) // self.unicode_size
-            ) + 1
-            return self.shift + unicodes_in_shift * self.unicode_size
-        elif shifted_letter_unicode >= self.unicode_size:
-            unicodes_in_shift = shifted_letter_unicode // self.unicode_size
-            return self.shift - unicodes_in_shift * self.unicode_size
-        else:
-            return self.shift
+@lru_cache
+def _get_byte_shift_table(shift):
+    return bytes((byte + shift) % 256 for byte in range(256))
 
 
 add_cipher_options(
@@ -99,17 +176,45 @@ add_cipher_options(
         "--phrase",
         help="""
             known decrypted phrase from encrypted text which allows to
-            determine correct one from possible decryptions
+            determine correct one from possible decryptions; without it
+            decryptions are ranked by how much they look like a language
+        """,
+    ),
+    option(
+        "-n",
+        "--top",
+        type=int,
+        default=3,
+        show_default=True,
+        help="number of the most probable decryptions to show in bruteforce",
+    ),
+    option(
+        "-l",
+        "--language",
+        type=Choice(LANGUAGES),
+        multiple=True,
+        help="""
+            language of decrypted text to rank decryptions by, can be given
+            several times; all known languages are tried by default
         """,
     ),
     constraint(
         If(
-            "bruteforce",
-            then=require_all,
-            else_=accept_none.rephrased(
-                error="--phrase should not be provided"
+            ~IsSet("bruteforce"),
+            then=accept_none.rephrased(
+                error="--phrase and --language should not be provided"
             ),
         ),
-        ("phrase", "bruteforce"),
+        ("phrase", "language"),
+    ),
+    option(
+        "-B",
+        "--binary",
+        is_flag=True,
+        help="""
+            process input as raw bytes read and written by chunks instead of
+            text, every byte is shifted modulo 256
+        """,
     ),
+    constraint(If("bruteforce", then=accept_none), ["binary"]),
 )
@@ -1,12 +1,32 @@
 from cloup import option, Path, Choice
-from cloup.constraints import constraint, require_one
+from cloup.constraints import (
+    constraint,
+    require_one,
+    require_all,
+    accept_none,
+    If,
+    IsSet,
+)
 from enum import Enum
 from base64 import b64encode, b64decode
+from codecs import getincrementaldecoder
+from struct import Struct
+from typing import Iterable, Iterator
 from Crypto.Cipher import DES
+from Crypto.Random import get_random_bytes
 from Crypto.Util.Padding import pad, unpad
 
 from .base_cipher import BaseCipher
-from ..file_operations import load_text_from_file
+from ..cipher_streams import CipherStream, StreamChain
+from ..des_ctr import (
+    CTR_NONCE_SIZE,
+    CtrFile,
+    new_ctr_cipher,
+    pack_ctr_iv,
+    unpack_ctr_iv,
+)
+from ..des_keyspace import KeyspaceSearch, parse_mask
+from ..file_operations import FileChunks, load_text_from_file, parse_range
 from ...ui import add_cipher_options
 
 
@@ -18,56 +38,228 @@ class des_modes(Enum):
     ctr = DES.MODE_CTR
 
 
+# binary mode output starts with magic, mode, IV (nonce and initial
+# counter for CTR) length and the IV itself, raw ciphertext follows
+BINARY_HEADER = Struct("=4sBB")
+BINARY_MAGIC = b"CSDS"
+WHITESPACE = str.maketrans("", "", " \n\r\t")
+
+
 class Des(BaseCipher):
-    def __init__(self, text: str, key: str, key_from_file: str, mode: str):
+    cached_methods = ("bruteforce",)
+
+    def __init__(
+        self,
+        text: str = None,
+        key: str = None,
+        key_from_file: str = None,
+        mode: str = "cbc",
+        binary: bool = False,
+        mask: str = None,
+        charset: str = None,
+        phrase: str = None,
+        workers: int = None,
+        checkpoint: str = None,
+        data_range: str = None,
+    ):
         self.unicode_size = int(0x110000)
         if key_from_file is not None:
             key = load_text_from_file(key_from_file)
-        self.key = self._validate_key(key)
+        if key is not None:
+            self.key = self._validate_key(key)
         self.text = text
         self.mode = des_modes[mode]
+        self.binary = binary
+        self.mask = mask
+        self.charset = charset
+        self.phrase = phrase
+        self.workers = workers
+        self.checkpoint = checkpoint
+        self.data_range = parse_range(data_range) if data_range else None
 
-    def encrypt(self) -> str:
-        if self.mode == des_modes.ctr:
-            cipher = DES.new(self.key.encode("utf-8"), self.mode.value, nonce=b"")
-            encrypted_text = b64encode(
-                cipher.encrypt(self.text.encode("utf-8"))
-            ).decode("utf-8")
-        else:
-            cipher = DES.new(self.key.encode("utf-8"), self.mode.value)
-            encrypted_text = b64encode(
-                cipher.encrypt(pad(self.text.encode("utf-8"), DES.block_size))
-            ).decode("utf-8")
-        if self.mode in (des_modes.ecb, des_modes.ctr):
-            return encrypted_text
-        else:
-            iv = b64encode(cipher.iv).decode("utf-8")  # type: ignore
-            return encrypted_text + iv
+    def encrypt(self) -> str | Iterator[bytes]:
+        if self.binary:
+            return self.encrypt_chunks(self.text)
+        return "".join(self.encrypt_chunks([self.text]))
 
-    def decrypt(self) -> str:
+    def decrypt(self) -> str | Iterator[bytes]:
+        if self.binary:
+            return self.decrypt_chunks(self.text)
         try:
+            ciphertext, iv = self._split_encrypted_text()
             if self.mode == des_modes.ecb:
                 cipher = DES.new(self.key.encode("utf-8"), self.mode.value)
             elif self.mode == des_modes.ctr:
                 cipher = DES.new(self.key.encode("utf-8"), self.mode.value, nonce=b"")
-                return cipher.decrypt(b64decode(self.text)).decode("utf-8")
+                return cipher.decrypt(ciphertext).decode("utf-8")
             else:
-                iv = self.text[-12:]
-                self.text = self.text[:-12]
-                cipher = DES.new(
-                    self.key.encode("utf-8"), self.mode.value, b64decode(iv)
-                )
-            return unpad(cipher.decrypt(b64decode(self.text)), DES.block_size).decode(
-                "utf-8"
-            )
+                cipher = DES.new(self.key.encode("utf-8"), self.mode.value, iv)
+            return unpad(cipher.decrypt(ciphertext), DES.block_size).decode("utf-8")
         except ValueError:
             self._terminate(
                 f"This text was not encrypted using {self.mode.name.upper()} mode"
             )
-            return ""
+
+    def encryptor(self) -> CipherStream:
+        padded = self.mode in (des_modes.ecb, des_modes.cbc)
+        if self.binary:
+            cipher = self._new_binary_cipher()
+            iv = b"" if self.mode == des_modes.ecb else self._get_cipher_iv(cipher)
+            header = BINARY_HEADER.pack(BINARY_MAGIC, self.mode.value, len(iv))
+            return BlockEncryptor(cipher, padded, header + iv)
+        if self.mode == des_modes.ctr:
+            cipher = DES.new(self.key.encode("utf-8"), self.mode.value, nonce=b"")
+        else:
+            cipher = DES.new(self.key.encode("utf-8"), self.mode.value)
+        # text mode IV is written in base64 after the whole text
+        iv = b"" if self.mode in (des_modes.ecb, des_modes.ctr) else cipher.iv
+        return StreamChain(
+            CipherStream(lambda chunk: chunk.encode("utf-8")),
+            BlockEncryptor(cipher, self.mode != des_modes.ctr),
+            Base64Encoder(),
+            CipherStream(lambda chunk: chunk, lambda: b64encode(iv).decode("utf-8")),
+        )
+
+    def decryptor(self) -> CipherStream:
+        padded = self.mode in (des_modes.ecb, des_modes.cbc)
+        if self.binary:
+            return BinaryDecryptor(self, padded)
+        if self.mode == des_modes.ecb:
+            cipher = DES.new(self.key.encode("utf-8"), self.mode.value)
+        elif self.mode == des_modes.ctr:
+            cipher = DES.new(self.key.encode("utf-8"), self.mode.value, nonce=b"")
+        else:
+            # IV follows the whole text, so it is not known until the end
+            return super().decryptor()
+        decoder = getincrementaldecoder("utf-8")()
+        return StreamChain(
+            Base64Decoder(),
+            BlockDecryptor(cipher, self.mode == des_modes.ecb),
+            CipherStream(decoder.decode, lambda: decoder.decode(b"", final=True)),
+        )
+
+    def encrypt_chunks(self, chunks: Iterable) -> Iterator:
+        if not self._is_seekable_ctr(chunks):
+            return super().encrypt_chunks(chunks)
+        nonce = get_random_bytes(CTR_NONCE_SIZE)
+        return self._seekable_ctr_chunks(
+            pack_ctr_iv(nonce, 0), CtrFile(chunks, 0, self._byte_key(), nonce, 0)
+        )
+
+    def decrypt_chunks(self, chunks: Iterable) -> Iterator:
+        try:
+            if self._is_seekable_ctr(chunks):
+                yield from self._seekable_ctr_chunks(
+                    b"", self._open_ctr_file(chunks)
+                )
+            else:
+                yield from super().decrypt_chunks(chunks)
+        except ValueError:
+            target = "file" if self.binary else "text"
+            self._terminate(
+                f"This {target} was not encrypted using "
+                f"{self.mode.name.upper()} mode"
+            )
 
     def bruteforce(self) -> str:
-        return "NotImplemented"
+        try:
+            charsets = parse_mask(self.mask, self.charset)
+            ciphertext, iv = self._split_encrypted_text()
+            search = KeyspaceSearch(
+                charsets,
+                self.mode.value,
+                ciphertext,
+                iv,
+                self.phrase,
+                self.workers,
+                self.checkpoint,
+            )
+            key, decrypted_text, tested, elapsed = search.run()
+        except ValueError as e:
+            self._terminate(f"Cannot bruteforce this text: {e}")
+        statistics = (
+            f"{tested} of {search.keyspace_size} keys were tested in "
+            f"{elapsed:.1f}s ({tested / max(elapsed, 1e-9):.0f} keys/sec)."
+        )
+        if key is None:
+            return f"There is no such key in the given mask :c\n{statistics}"
+        return (
+            f"Text was successfully decrypted with key "
+            f"{key.decode('utf-8')!r} (keys differing from it only in the "
+            f"lowest bits of bytes are the same). {statistics} Result is:\n"
+            f"{decrypted_text}"
+        )
+
+    def _is_seekable_ctr(self, chunks: Iterable) -> bool:
+        # binary CTR files can be processed from any position and by several
+        # processes, other input is streamed from its start
+        if self.data_range is None and (self.workers or 1) < 2:
+            return False
+        if not self.binary or self.mode != des_modes.ctr:
+            self._terminate("--range and --workers need binary CTR mode")
+        if not isinstance(chunks, FileChunks):
+            self._terminate("--range and --workers need input file")
+        return True
+
+    def _seekable_ctr_chunks(self, header_iv: bytes, ctr_file: CtrFile):
+        if header_iv:
+            yield BINARY_HEADER.pack(
+                BINARY_MAGIC, self.mode.value, len(header_iv)
+            ) + header_iv
+        start, end = self.data_range or (0, None)
+        yield from ctr_file.process(start, end, self.workers)
+
+    def _open_ctr_file(self, chunks: FileChunks) -> CtrFile:
+        max_header_size = BINARY_HEADER.size + 0xFF
+        header = b"".join(chunks.read_range(0, max_header_size))
+        if (header := self._read_binary_header(header)) is None:
+            self._terminate("This file was not encrypted in binary mode")
+        iv, _ = header
+        nonce, counter = unpack_ctr_iv(iv)
+        data_offset = BINARY_HEADER.size + len(iv)
+        return CtrFile(chunks, data_offset, self._byte_key(), nonce, counter)
+
+    def _byte_key(self) -> bytes:
+        return self.key.encode("utf-8")
+
+    def _split_encrypted_text(self) -> tuple[bytes, bytes]:
+        text = self.text.strip()
+        if self.mode in (des_modes.ecb, des_modes.ctr):
+            return b64decode(text), b""
+        return b64decode(text[:-12]), b64decode(text[-12:])
+
+    def _read_binary_header(self, data: bytes) -> tuple[bytes, bytes] | None:
+        if len(data) < BINARY_HEADER.size:
+            return None
+        magic, mode, iv_len = BINARY_HEADER.unpack_from(data)
+        if magic != BINARY_MAGIC:
+            self._terminate("This file was not encrypted in binary mode")
+        if mode != self.mode.value:
+            self._terminate(
+                f"This file was not encrypted using {self.mode.name.upper()} mode"
+            )
+        iv_end = BINARY_HEADER.size + iv_len
+        if len(data) < iv_end:
+            return None
+        return data[BINARY_HEADER.size : iv_end], data[iv_end:]
+
+    def _new_binary_cipher(self, iv: bytes | None = None):
+        key = self.key.encode("utf-8")
+        if self.mode == des_modes.ecb:
+            return DES.new(key, self.mode.value)
+        elif self.mode == des_modes.ctr:
+            if iv is None:
+                iv = pack_ctr_iv(get_random_bytes(CTR_NONCE_SIZE), 0)
+            return new_ctr_cipher(key, *unpack_ctr_iv(iv))
+        elif iv is not None:
+            return DES.new(key, self.mode.value, iv)
+        return DES.new(key, self.mode.value)
+
+    def _get_cipher_iv(self, cipher) -> bytes:
+        if self.mode == des_modes.ctr:
+            # new ciphers count blocks from 0
+            return pack_ctr_iv(cipher.nonce, 0)
+        return cipher.iv
 
     def _validate_key(self, key: str) -> str:
         byte_key = key.encode("utf-8")
@@ -76,9 +268,103 @@ class Des(BaseCipher):
             self._terminate(f"Key must be 8 bytes length (but {key_len} was given)")
         return key
 
-    def _terminate(self, message):
-        print(message)
-        exit(0)
+
+class BlockEncryptor(CipherStream):
+    # data is encrypted by whole blocks, the rest waits for the next chunk
+    def __init__(self, cipher, padded: bool, header: bytes = b""):
+        self.cipher = cipher
+        self.padded = padded
+        self.header = header
+        self.tail = b""
+
+    def update(self, chunk: bytes) -> bytes:
+        data = self.tail + chunk
+        aligned_len = len(data) - len(data) % DES.block_size
+        self.tail = data[aligned_len:]
+        output = self.header + self.cipher.encrypt(data[:aligned_len])
+        self.header = b""
+        return output
+
+    def finalize(self) -> bytes:
+        tail = pad(self.tail, DES.block_size) if self.padded else self.tail
+        output = self.header + self.cipher.encrypt(tail)
+        self.header = b""
+        return output
+
+
+class BlockDecryptor(CipherStream):
+    def __init__(self, cipher, padded: bool):
+        self.cipher = cipher
+        self.padded = padded
+        self.tail = b""
+
+    def update(self, chunk: bytes) -> bytes:
+        data = self.tail + chunk
+        aligned_len = len(data) - len(data) % DES.block_size
+        if self.padded and aligned_len == len(data):
+            # the last block is kept back to be unpadded at the end
+            aligned_len -= DES.block_size
+        aligned_len = max(aligned_len, 0)
+        self.tail = data[aligned_len:]
+        return self.cipher.decrypt(data[:aligned_len])
+
+    def finalize(self) -> bytes:
+        if self.padded:
+            return unpad(self.cipher.decrypt(self.tail), DES.block_size)
+        return self.cipher.decrypt(self.tail)
+
+
+class BinaryDecryptor(CipherStream):
+    # cipher is created as soon as the header with IV is read
+    def __init__(self, des: Des, padded: bool):
+        self.des = des
+        self.padded = padded
+        self.header = b""
+        self.decryptor = None
+
+    def update(self, chunk: bytes) -> bytes:
+        if self.decryptor is not None:
+            return self.decryptor.update(chunk)
+        self.header += chunk
+        if (header := self.des._read_binary_header(self.header)) is None:
+            return b""
+        iv, data = header
+        cipher = self.des._new_binary_cipher(iv)
+        self.decryptor = BlockDecryptor(cipher, self.padded)
+        return self.decryptor.update(data)
+
+    def finalize(self) -> bytes:
+        if self.decryptor is None:
+            self.des._terminate("This file was not encrypted in binary mode")
+        return self.decryptor.finalize()
+
+
+class Base64Encoder(CipherStream):
+    def __init__(self):
+        self.tail = b""
+
+    def update(self, chunk: bytes) -> str:
+        data = self.tail + chunk
+        aligned_len = len(data) - len(data) % 3
+        self.tail = data[aligned_len:]
+        return b64encode(data[:aligned_len]).decode("utf-8")
+
+    def finalize(self) -> str:
+        return b64encode(self.tail).decode("utf-8")
+
+
+class Base64Decoder(CipherStream):
+    def __init__(self):
+        self.tail = ""
+
+    def update(self, chunk: str) -> bytes:
+        data = self.tail + chunk.translate(WHITESPACE)
+        aligned_len = len(data) - len(data) % 4
+        self.tail = data[aligned_len:]
+        return b64decode(data[:aligned_len], validate=True)
+
+    def finalize(self) -> bytes:
+        return b64decode(self.tail, validate=True)
 
 
 add_cipher_options(
@@ -113,7 +399,79 @@ add_cipher_options(
             - CBC
             - CFB
             - OFB
-            - CTR
+            - CTR, which encrypts up to 32 GiB in binary mode
+        """,
+    ),
+    option(
+        "-B",
+        "--binary",
+        is_flag=True,
+        help="""
+            process input as raw bytes read and written by chunks instead of
+            text, encrypted data is written as raw bytes with a small header
+        """,
+    ),
+    constraint(If("bruteforce", then=accept_none), ["binary"]),
+    option(
+        "--mask",
+        type=str,
+        help="""
+            mask of 8-byte key to bruteforce, where every symbol is either
+            itself or one of the following charsets:
+
+            \b
+            - ?l lowercase letters
+            - ?u uppercase letters
+            - ?d digits
+            - ?s space and punctuation
+            - ?a all of the above
+            - ?1 symbols from --charset
+            - ?? question mark itself
+
+            \b
+                Example:
+                --mask "pass?d?d?d?d"
+        """,
+    ),
+    option("--charset", type=str, help="custom charset for ?1 in --mask"),
+    option(
+        "-p",
+        "--phrase",
+        help="""
+            known decrypted phrase from encrypted text, without it any key
+            which gives printable text is accepted
+        """,
+    ),
+    option(
+        "-w",
+        "--workers",
+        type=int,
+        help="""
+            number of bruteforce processes, all CPUs by default; binary CTR
+            files are encrypted and decrypted by this many processes when
+            it is given
+        """,
+    ),
+    option(
+        "--checkpoint",
+        type=Path(),
+        help="""
+            file to save bruteforce progress to and to resume it from
+        """,
+    ),
+    constraint(If("bruteforce", then=require_all), ["mask"]),
+    constraint(
+        If(~IsSet("bruteforce"), then=accept_none),
+        ["mask", "charset", "phrase", "checkpoint"],
+    ),
+    option(
+        "--range",
+        "data_range",
+        type=str,
+        help="""
+            decrypt only bytes from START to END (excluding it) of binary CTR
+            file, given as START:END, without reading the rest of it
         """,
     ),
+    constraint(If(~IsSet("decrypt"), then=accept_none), ["data_range"]),
 )
@@ -1,11 +1,27 @@
 from cloup import option, Path
-from cloup.constraints import constraint, require_one
-from itertools import cycle
-from typing import Any, Sequence
+from cloup.constraints import (
+    constraint,
+    require_one,
+    accept_none,
+    require_all,
+    If,
+)
+from typing import Any, Iterable, Iterator, Sequence
 from enum import Enum, auto
 
 from .base_cipher import BaseCipher
-from ..file_operations import load_text_from_file
+from ..byte_lanes import add_bytes, negate_bytes, repeat_bytes
+from ..cipher_streams import CipherStream
+from ..code_point_lanes import (
+    add_lanes,
+    code_point_differences,
+    lanes_to_text,
+    polynomial_lanes,
+    repeat_lane,
+    repeat_lanes,
+    text_to_lanes,
+)
+from ..file_operations import load_text_from_file, parse_range, read_chunks_range
 from ...ui import add_cipher_options
 
 
@@ -16,48 +32,120 @@ class key_type(Enum):
 
 
 class Trithemius(BaseCipher):
-    def __init__(self, text: str, key: str, key_from_file: str):
-        self._change_key_sign = False
+    cached_methods = ("bruteforce",)
+
+    def __init__(
+        self,
+        text: str = None,
+        key: str = None,
+        key_from_file: str = None,
+        phrase: str = None,
+        binary: bool = False,
+        data_range: str = None,
+    ):
         self.unicode_size = int(0x110000)
         self.text = text
+        self.binary = binary
+        self.data_range = parse_range(data_range) if data_range else None
         if key_from_file is not None:
             key = load_text_from_file(key_from_file)
-        self.key = self._validate_key(key)
-        self.key_type = self._get_key_type(key)
-        self.cipher_func = self._get_cipher_func(self.key_type)
+        if key is not None:
+            self._set_key(self._validate_key(key))
+        if phrase is not None:
+            self.phrase = phrase
+            self._validate_phrase()
 
     def encrypt(self) -> str:
-        key = self._cycle_key(self.key, self.key_type)
-        return "".join(
-            chr(self._validate_letter_unicode(ord(letter) + self.cipher_func(i, key)))
-            for i, (letter, key) in enumerate(zip(self.text, key))
-        )
+        return self.encrypt_text(self.text)
 
     def decrypt(self) -> str:
-        self._change_key_sign = True
-        return self.encrypt()
+        return self.decrypt_text(self.text)
+
+    def encryptor(self) -> CipherStream:
+        return self._shift_stream(1)
+
+    def decryptor(self) -> CipherStream:
+        return self._shift_stream(-1)
+
+    def encrypt_chunks(self, chunks: Iterable) -> Iterator:
+        return self._shift_chunks(chunks, 1)
+
+    def decrypt_chunks(self, chunks: Iterable) -> Iterator:
+        return self._shift_chunks(chunks, -1)
+
+    def _shift_chunks(self, chunks: Iterable, sign: int) -> Iterator:
+        # shifts depend only on absolute positions, so a range is shifted
+        # without anything before it, and input files are read from its start
+        if self.data_range is None:
+            return self._shift_stream(sign).process(chunks)
+        start, end = self.data_range
+        chunks = read_chunks_range(chunks, start, end)
+        return self._shift_stream(sign, start).process(chunks)
 
     def bruteforce(self) -> str:
-        return "NotImplemented"
+        keys = self._find_phrase_keys()
+        if not keys:
+            return "There is no such phrase in any possible text decryption :c"
+        return "\n\n".join(self._describe_decryption(key) for key in keys)
 
-    def motto_shift_func(self, _, key: int) -> int:
-        return key
+    def _find_phrase_keys(self) -> list[list[int]]:
+        # polynomial shifts of degree 2 vanish in third differences of code
+        # points (of degree 1 in second ones), so phrase differences can be
+        # searched directly in the text differences
+        order = 2 if len(self.phrase) == 3 else 3
+        text_diffs = code_point_differences(self.text, order)
+        phrase_diffs = code_point_differences(self.phrase, order)
+        keys = dict()
+        position = text_diffs.find(phrase_diffs)
+        while position != -1:
+            if key := self._solve_key(position):
+                keys[tuple(key)] = None
+            position = text_diffs.find(phrase_diffs, position + 1)
+        return [list(key) for key in keys]
 
-    def linear_shift_func(self, p: int, key: list[int]) -> int:
-        A, B = key
-        return A * p + B
+    def _solve_key(self, p: int) -> list[int] | None:
+        # s = Ap^2 + Bp + C is recovered from the first three phrase shifts,
+        # 2A is their second difference, which must be even modulo even
+        # unicode size; A + unicode size / 2 would give the very same shifts
+        s0, s1, s2 = (
+            (ord(self.text[p + i]) - ord(letter)) % self.unicode_size
+            for i, letter in enumerate(self.phrase[:3])
+        )
+        double_A = (s2 - 2 * s1 + s0) % self.unicode_size
+        if double_A % 2:
+            return None
+        A = double_A // 2
+        B = (s1 - s0 - A * (2 * p + 1)) % self.unicode_size
+        C = (s0 - A * p**2 - B * p) % self.unicode_size
+        if A != 0:
+            return [A, B, C]
+        elif B != 0 or C != 0:
+            return [B, C]
+        return None
 
-    def non_linear_shift_func(self, p: int, key: list[int]) -> int:
-        A, B, C = key
-        return A * p**2 + B * p + C
+    def _describe_decryption(self, key: list[int]) -> str:
+        self._set_key(str(key))
+        decrypted_text = self.decrypt()
+        return (
+            f"Text was successfully decrypted with key {self.key}. "
+            f"Result is:\n{decrypted_text}"
+        )
 
     def _validate_key(self, key: str) -> str:
         if len(key) == 0:
             self._terminate("Key must contain at least one symbol")
         return key
 
-    def _validate_letter_unicode(self, letter_unicode: int) -> int:
-        return letter_unicode % self.unicode_size
+    def _set_key(self, key: str):
+        # the key is evaluated once, every text and chunk uses its shifts
+        self.key = key
+        self.key_type = self._get_key_type(key)
+        if self.key_type is key_type.motto:
+            self.key_shifts = [ord(letter) for letter in key]
+        else:
+            self.key_shifts = list(self._eval_key(key))
+        if self.binary:
+            self.byte_shifts = self._get_byte_shifts(key)
 
     def _get_key_type(self, key: str) -> key_type:
         if evaluated_key := self._eval_key(key):
@@ -67,26 +155,58 @@ class Trithemius(BaseCipher):
                 return key_type.linear
         return key_type.motto
 
-    def _cycle_key(self, key: str, key_type_: key_type):  # TYPE ???
-        if key_type_ is key_type.motto:
-            return cycle(
-                [
-                    ord(letter) if not self._change_key_sign else -ord(letter)
-                    for letter in key
-                ]
-            )
+    def _shift_stream(self, sign: int, position: int = 0) -> CipherStream:
+
+        def shift_chunk(chunk: str) -> str:
+            nonlocal position
+            shifted_chunk = self._shift_text(chunk, position, sign)
+            position += len(chunk)
+            return shifted_chunk
+
+        return CipherStream(shift_chunk)
+
+    def _get_byte_shifts(self, key: str) -> dict[int, bytes]:
+        # byte shifts repeat with the motto bytes, and polynomial ones
+        # modulo 256 repeat every 256 positions
+        if self.key_type is key_type.motto:
+            shifts = key.encode("utf-8")
         else:
-            return cycle(
-                [[num if not self._change_key_sign else -num for num in eval(key)]]
-            )
+            *A, B, C = self.key_shifts
+            A = A[0] if A else 0
+            shifts = bytes((A * p * p + B * p + C) % 256 for p in range(256))
+        return {1: shifts, -1: negate_bytes(shifts)}
 
-    def _get_cipher_func(self, key_type_: key_type):  # TYPE ???
-        functions = {
-            key_type.non_linear: self.non_linear_shift_func,
-            key_type.linear: self.linear_shift_func,
-            key_type.motto: self.motto_shift_func,
-        }
-        return functions[key_type_]
+    def _shift_text(self, text: str, start: int, sign: int = 1) -> str:
+        if self.binary:
+            shifts = repeat_bytes(self.byte_shifts[sign], start, len(text))
+            return add_bytes(text, shifts)
+        text_len = len(text)
+        shifted_lanes = add_lanes(
+            text_to_lanes(text),
+            self._get_shift_lanes(text_len, start, sign),
+            repeat_lane(1, text_len),
+        )
+        return lanes_to_text(shifted_lanes, text_len)
+
+    def _get_shift_lanes(self, text_len: int, start: int, sign: int) -> int:
+        if self.key_type is key_type.motto:
+            start %= len(self.key_shifts)
+            shifts = self.key_shifts[start:] + self.key_shifts[:start]
+            return repeat_lanes([sign * shift for shift in shifts], text_len)
+        # a chunk from position start is shifted by the key polynomial moved
+        # by start: A(p + start)^2 + B(p + start) + C
+        *A, B, C = self.key_shifts
+        A = A[0] if A else 0
+        coefficients = [
+            A,
+            2 * A * start + B,
+            A * start**2 + B * start + C,
+        ]
+        if not A:
+            coefficients = coefficients[1:]
+        return polynomial_lanes(
+            [sign * num % self.unicode_size for num in coefficients], text_len
+        )
 
     def _eval_key(self, key: str) -> Any | bool:
         if all(letter in "[( )],-0123456789" for letter in key):
@@ -96,16 +216,25 @@ class Trithemius(BaseCipher):
                 pass
         return False
 
+    def _validate_phrase(self):
+        if len(self.phrase) < 3:
+            self._terminate(
+                "Phrase must contain at least 3 symbols to recover the key"
+            )
+        elif self.text is None:
+            self._terminate("Phrase can only be used with the text to bruteforce")
+        elif len(self.phrase) > len(self.text):
+            self._terminate(
+                "Are you seriously trying to use a phrase from text "
+                "longer than text itself?"
+            )
+
     def _validate_key_structure(self, key: Any, length: int) -> bool:
         if isinstance(key, Sequence) and len(key) == length:
             if all(isinstance(el, int) for el in key):
                 return True
         return False
 
-    def _terminate(self, message):
-        print(message)
-        exit(0)
-
 
 add_cipher_options(
     Trithemius,
@@ -156,4 +285,46 @@ add_cipher_options(
         """,
     ),
     constraint(require_one, ("bruteforce", "key", "key_from_file")),
+    option(
+        "-p",
+        "--phrase",
+        help="""
+            known decrypted phrase from encrypted text which allows to
+            recover linear or non-linear key, must contain at least
+            3 symbols (4 to recover non-linear key)
+        """,
+    ),
+    constraint(
+        If(
+            "bruteforce",
+            then=require_all,
+            else_=accept_none.rephrased(
+                error="--phrase should not be provided"
+            ),
+        ),
+        ("phrase", "bruteforce"),
+    ),
+    option(
+        "-B",
+        "--binary",
+        is_flag=True,
+        help="""
+            process input as raw bytes read and written by chunks instead of
+            text, every byte is shifted modulo 256 (motto key by its utf-8
+            bytes)
+        """,
+    ),
+    constraint(If("bruteforce", then=accept_none), ["binary"]),
+    option(
+        "--range",
+        "data_range",
+        type=str,
+        help="""
+            process only symbols (bytes in binary mode) from START to END
+            (excluding it), given as START:END, with shifts of their
+            positions in the whole text; binary input files are read from
+            START, text ones are decoded up to it without shifting
+        """,
+    ),
+    constraint(If("bruteforce", then=accept_none), ["data_range"]),
 )
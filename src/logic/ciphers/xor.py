@@ -1,58 +1,296 @@
 from cloup import option, Path
-from cloup.constraints import constraint, AcceptAtMost, require_one
+from cloup.constraints import constraint, require_one, accept_none, If
+from collections import Counter
+from functools import lru_cache
+from heapq import heappop, heappush
+from math import log
 import random
 
 from .base_cipher import BaseCipher
+from ..byte_lanes import repeat_bytes, xor_bytes
+from ..cipher_streams import CipherStream, StreamChain, TextStripper
+from ..code_point_lanes import lanes_to_text, repeat_lanes, text_to_lanes
 from ..file_operations import load_text_from_file
 from ...ui import add_cipher_options
 
 
+# relative frequencies of symbols in english text, the rest of printable
+# symbols share OTHER_FREQUENCY and unprintable ones UNPRINTABLE_FREQUENCY
+LETTER_FREQUENCIES = {
+    " ": 0.1831,
+    "e": 0.1024,
+    "t": 0.0751,
+    "a": 0.0655,
+    "o": 0.0620,
+    "n": 0.0571,
+    "i": 0.0573,
+    "s": 0.0532,
+    "r": 0.0499,
+    "h": 0.0497,
+    "l": 0.0332,
+    "d": 0.0328,
+    "u": 0.0228,
+    "c": 0.0223,
+    "m": 0.0203,
+    "f": 0.0198,
+    "w": 0.0170,
+    "g": 0.0162,
+    "p": 0.0150,
+    "y": 0.0142,
+    "b": 0.0126,
+    "v": 0.0080,
+    "k": 0.0056,
+    "x": 0.0014,
+    "j": 0.0010,
+    "q": 0.0008,
+    "z": 0.0005,
+    ",": 0.0100,
+    ".": 0.0090,
+    "\n": 0.0050,
+}
+OTHER_FREQUENCY = 0.0005
+UNPRINTABLE_FREQUENCY = 1e-7
+COMMON_SYMBOLS = sorted(LETTER_FREQUENCIES, key=LETTER_FREQUENCIES.get)[:-9:-1]
+COLUMN_CANDIDATES = 4
+KEY_LENGTH_SAMPLE_SIZE = 200_000
+
+
 class XOR(BaseCipher):
-    def __init__(self, text: str, key: str, key_from_file: str, seed: int):
-        self.text = text.strip()
+    cached_methods = ("bruteforce",)
+
+    def __init__(
+        self,
+        text: str = None,
+        key: str = None,
+        key_from_file: str = None,
+        seed: int = None,
+        max_key_length: int = 32,
+        top: int = 3,
+        binary: bool = False,
+    ):
+        self.binary = binary
+        if binary:
+            self.text = text if text is not None else b""
+        else:
+            self.text = text.strip() if text is not None else ""
         self.unicode_size = int(0x110000)
         self.message = ""
+        self.max_key_length = max_key_length
+        self.top = top
+        self.seed = seed
+        if key_from_file is not None:
+            key = load_text_from_file(key_from_file)
         if key is not None:
             self.key = self._validate_key(key)
-        elif key_from_file is not None:
-            self.key = self._validate_key(load_text_from_file(key_from_file))
-        else:
-            if seed is not None:
-                random.seed(seed)
-            self.key = self._generate_seed()
-            # self.message = (
-            # f"\n\nText was encrypted using this generated key:\n{self.key}"
-            # )
+            # repeated key starts after its leading whitespace, as stripped
+            # text does
+            self.key_symbols = [ord(symbol) for symbol in self.key]
+            self.key_start = len(self.key) - len(self.key.lstrip())
+            if binary:
+                self.key_bytes = self._encode_key(self.key)
+        # self.message = (
+        # f"\n\nText was encrypted using this generated key:\n{self.key}"
+        # )
 
     def encrypt(self) -> str:
-        return "".join(
-            [chr(ord(ch) ^ ord(k)) for ch, k in zip(self.text, self.key)]
-        )
+        return self.encrypt_text(self.text)
 
     def decrypt(self) -> str:
         return self.encrypt()
 
+    def encryptor(self) -> CipherStream:
+        # generated key starts from the seed again for every text
+        generator = random.Random(self.seed) if self.seed is not None else None
+        if self.binary:
+            return self._byte_xor_stream(generator)
+        position = 0
+
+        def xor_chunk(chunk: str) -> str:
+            nonlocal position
+            chunk_len = len(chunk)
+            key_lanes = self._get_key_lanes(position, chunk_len, generator)
+            position += chunk_len
+            return lanes_to_text(text_to_lanes(chunk) ^ key_lanes, chunk_len)
+
+        return StreamChain(TextStripper(), CipherStream(xor_chunk))
+
+    def decryptor(self) -> CipherStream:
+        return self.encryptor()
+
+    def _byte_xor_stream(self, generator: random.Random | None) -> CipherStream:
+        # bytes-like data is xored as is, it is not stripped as text is
+        position = 0
+        generated = b""
+
+        def xor_chunk(chunk: bytes) -> bytes:
+            nonlocal position, generated
+            if generator is not None:
+                # random bytes come by whole 32-bit words, so the key does
+                # not depend on chunk sizes
+                if (missing := len(chunk) - len(generated)) > 0:
+                    generated += generator.randbytes(-(-missing // 4) * 4)
+                key_stream = generated[: len(chunk)]
+                generated = generated[len(chunk) :]
+            else:
+                key_stream = repeat_bytes(self.key_bytes, position, len(chunk))
+            position += len(chunk)
+            return xor_bytes(chunk, key_stream)
+
+        return CipherStream(xor_chunk)
+
     def bruteforce(self) -> str:
-        return "NotImplemented"
+        candidates = self._find_key_candidates()
+        if not candidates:
+            return "Text is too short to guess the key :c"
+        return "\n\n".join(
+            f"Text was decrypted with key {key!r} (score {score:.3f}). "
+            f"Result is:\n{self._decrypt_with_key(key)}"
+            for score, key in candidates
+        )
 
-    def _validate_key(self, key: str) -> str:
-        if not len(key):
-            self._terminate("Key must contain at least one symbol")
-        keys_in_text = len(self.text) // len(key) + 1
-        full_key = key * keys_in_text
-        return full_key.strip()
-
-    def _generate_seed(self) -> str:
-        return "".join(
-            [
-                chr(random.randint(0, self.unicode_size - 1))
-                for _ in range(len(self.text))
+    def _find_key_candidates(self) -> list[tuple[float, str]]:
+        candidates = []
+        for key_length in self._estimate_key_lengths():
+            columns_candidates = [
+                self._get_column_candidates(self.text[i::key_length])
+                for i in range(key_length)
             ]
+            candidates.extend(self._combine_column_candidates(columns_candidates))
+        candidates.sort(reverse=True)
+        return candidates[: self.top]
+
+    def _estimate_key_lengths(self) -> list[int]:
+        # columns of symbols encrypted with the same key symbol keep index of
+        # coincidence of the plain text, which is much higher than the one of
+        # mixed columns; multiples of the key length keep it too
+        sample = self.text[:KEY_LENGTH_SAMPLE_SIZE]
+        max_key_length = min(self.max_key_length, len(sample) // 2)
+        coincidences = {
+            key_length: self._get_index_of_coincidence(sample, key_length)
+            for key_length in range(1, max_key_length + 1)
+        }
+        if not coincidences:
+            return []
+        threshold = 0.9 * max(coincidences.values())
+        key_lengths = []
+        for key_length, coincidence in coincidences.items():
+            if coincidence >= threshold and all(
+                key_length % other_length for other_length in key_lengths
+            ):
+                key_lengths.append(key_length)
+        return key_lengths[:3]
+
+    def _get_index_of_coincidence(self, text: str, key_length: int) -> float:
+        coincidences = 0
+        pairs = 0
+        for i in range(key_length):
+            column = text[i::key_length]
+            coincidences += sum(n * (n - 1) for n in Counter(column).values())
+            pairs += len(column) * (len(column) - 1)
+        return coincidences / pairs
+
+    def _get_column_candidates(self, column: str) -> list[tuple[float, int]]:
+        # the most common column symbols are supposed to be the most common
+        # plain text symbols, every such pair gives a key symbol to score
+        symbol_counts = [
+            (ord(symbol), count)
+            for symbol, count in Counter(column).most_common()
+        ]
+        key_symbols = {
+            symbol ^ ord(plain_symbol)
+            for symbol, _ in symbol_counts[:4]
+            for plain_symbol in COMMON_SYMBOLS
+        }
+        candidates = [
+            (
+                sum(
+                    count * _get_symbol_score(symbol ^ key_symbol)
+                    for symbol, count in symbol_counts
+                ),
+                key_symbol,
+            )
+            for key_symbol in key_symbols
+        ]
+        return sorted(candidates, reverse=True)[:COLUMN_CANDIDATES]
+
+    def _combine_column_candidates(
+        self, columns_candidates: list[list[tuple[float, int]]]
+    ) -> list[tuple[float, str]]:
+        # keys are taken best first, starting from the best symbol of every
+        # column and replacing one column symbol by its next candidate
+        def get_score(indices):
+            return sum(
+                candidates[i][0]
+                for candidates, i in zip(columns_candidates, indices)
+            )
+
+        best_indices = (0,) * len(columns_candidates)
+        heap = [(-get_score(best_indices), best_indices)]
+        seen = {best_indices}
+        keys = []
+        while heap and len(keys) < self.top:
+            score, indices = heappop(heap)
+            key = "".join(
+                chr(candidates[i][1])
+                for candidates, i in zip(columns_candidates, indices)
+            )
+            keys.append((-score / len(self.text), key))
+            for column, i in enumerate(indices):
+                if i + 1 < len(columns_candidates[column]):
+                    next_indices = (
+                        indices[:column] + (i + 1,) + indices[column + 1 :]
+                    )
+                    if next_indices not in seen:
+                        seen.add(next_indices)
+                        heappush(heap, (-get_score(next_indices), next_indices))
+        return keys
+
+    def _decrypt_with_key(self, key: str) -> str:
+        text_len = len(self.text)
+        decrypted_lanes = text_to_lanes(self.text) ^ repeat_lanes(
+            [ord(symbol) for symbol in key], text_len
         )
+        return lanes_to_text(decrypted_lanes, text_len, errors="replace")
+
+    def _get_key_lanes(
+        self, position: int, count: int, generator: random.Random | None
+    ) -> int:
+        if generator is not None:
+            # generated key symbols follow each other as long as the text
+            return repeat_lanes(
+                [generator.randint(0, self.unicode_size - 1) for _ in range(count)],
+                count,
+            )
+        start = (self.key_start + position) % len(self.key_symbols)
+        key_symbols = self.key_symbols[start:] + self.key_symbols[:start]
+        return repeat_lanes(key_symbols, count)
+
+    def _validate_key(self, key: str) -> str:
+        if not len(key.strip()):
+            self._terminate("Key must contain at least one non-whitespace symbol")
+        return key
 
-    def _terminate(self, message):
-        print(message)
-        exit(0)
+    def _encode_key(self, key: str) -> bytes:
+        # text mode xors code points, so only bytes need an encodable key
+        try:
+            return key.encode("utf-8")
+        except UnicodeEncodeError as e:
+            self._terminate(
+                f"Key symbol {e.object[e.start]!r} can't be encoded with utf-8 "
+                f"to encrypt bytes"
+            )
+
+
+@lru_cache(maxsize=0x10000)
+def _get_symbol_score(code_point: int) -> float:
+    if code_point >= 0x110000:
+        return log(UNPRINTABLE_FREQUENCY)
+    symbol = chr(code_point)
+    if frequency := LETTER_FREQUENCIES.get(symbol.lower()):
+        return log(frequency)
+    if symbol.isprintable():
+        return log(OTHER_FREQUENCY)
+    return log(UNPRINTABLE_FREQUENCY)
 
 
 add_cipher_options(
@@ -66,7 +304,32 @@ add_cipher_options(
         type=Path(),
         help="the same as --key option, but loads key from file",
     ),
-    constraint(AcceptAtMost(1), ("bruteforce", "key", "key_from_file")),
     option("-s", "--seed", type=int, help="Generate key by seed"),
-    constraint(require_one, ("key", "key_from_file", "seed")),
+    constraint(require_one, ("bruteforce", "key", "key_from_file", "seed")),
+    option(
+        "-B",
+        "--binary",
+        is_flag=True,
+        help="""
+            process input as raw bytes read and written by chunks instead of
+            text, bytes are xored with utf-8 bytes of the key
+        """,
+    ),
+    constraint(If("bruteforce", then=accept_none), ["binary"]),
+    option(
+        "-l",
+        "--max-key-length",
+        type=int,
+        default=32,
+        show_default=True,
+        help="maximum length of repeated key to look for in bruteforce",
+    ),
+    option(
+        "-n",
+        "--top",
+        type=int,
+        default=3,
+        show_default=True,
+        help="number of the most probable keys to show in bruteforce",
+    ),
 )
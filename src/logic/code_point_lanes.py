@@ -0,0 +1,93 @@
+# A text is packed into one big integer in which every code point takes its
+# own 32-bit lane, so per-symbol modular arithmetic becomes a handful of
+# linear-time integer operations. Lane values always stay reduced modulo
+# unicode size, that way sums of two lanes never overflow into the next one.
+UNICODE_SIZE = 0x110000
+LANE_BYTES = 4
+LANE_BITS = 8 * LANE_BYTES
+WRAP_BIT = 22
+
+
+def text_to_lanes(text: str) -> int:
+    return int.from_bytes(text.encode("utf-32-le", "surrogatepass"), "little")
+
+
+def lanes_to_text(
+    lanes: int, count: int, errors: str = "surrogatepass"
+) -> str:
+    return lanes.to_bytes(LANE_BYTES * count, "little").decode(
+        "utf-32-le", errors
+    )
+
+
+def repeat_lane(value: int, count: int) -> int:
+    return int.from_bytes(
+        (value % UNICODE_SIZE).to_bytes(LANE_BYTES, "little") * count,
+        "little",
+    )
+
+
+def repeat_lanes(values: list[int], count: int) -> int:
+    if count == 0:
+        return 0
+    pattern = b"".join(
+        (value % UNICODE_SIZE).to_bytes(LANE_BYTES, "little")
+        for value in values
+    )
+    repeats = -(-count // len(values))
+    return int.from_bytes(
+        (pattern * repeats)[: LANE_BYTES * count], "little"
+    )
+
+
+def add_lanes(x: int, y: int, ones: int) -> int:
+    added = x + y
+    # bit 22 of a lane is set only where the sum reached unicode size
+    wrapped = (
+        added + ones * ((1 << WRAP_BIT) - UNICODE_SIZE) >> WRAP_BIT & ones
+    )
+    return added - wrapped * UNICODE_SIZE
+
+
+def difference_lanes(lanes: int, count: int) -> int:
+    # lanes of (x[i + 1] - x[i]) mod unicode size, one lane fewer than x
+    count = max(count - 1, 0)
+    ones = repeat_lane(1, count)
+    head = lanes & (1 << LANE_BITS * count) - 1
+    return add_lanes(lanes >> LANE_BITS, ones * UNICODE_SIZE - head, ones)
+
+
+def code_point_differences(text: str, order: int = 1) -> str:
+    lanes = text_to_lanes(text)
+    count = len(text)
+    for _ in range(order):
+        lanes = difference_lanes(lanes, count)
+        count = max(count - 1, 0)
+    return lanes_to_text(lanes, count)
+
+
+def polynomial_lanes(coefficients: list[int], count: int) -> int:
+    # values of A * p^2 + B * p + C (or A * p + B) for p in [0, count) are
+    # doubled block by block: f(p + k) = f(p) + 2Akp + Ak^2 + Bk, where the
+    # 2Akp lanes are doubled along with the values themselves
+    A, B, C = [0] * (3 - len(coefficients)) + coefficients
+    values = C % UNICODE_SIZE
+    linear_steps = 0
+    ones = 1
+    k = 1
+    while k < count:
+        block_step = ones * ((A * k * k + B * k) % UNICODE_SIZE)
+        if A:
+            block_step = add_lanes(block_step, linear_steps, ones)
+        values |= add_lanes(values, block_step, ones) << LANE_BITS * k
+        if A:
+            linear_steps = add_lanes(linear_steps, linear_steps, ones)
+            linear_steps |= (
+                add_lanes(
+                    linear_steps, ones * (4 * A * k * k % UNICODE_SIZE), ones
+                )
+                << LANE_BITS * k
+            )
+        ones |= ones << LANE_BITS * k
+        k *= 2
+    return values & (1 << LANE_BITS * count) - 1
@@ -0,0 +1,148 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator
+from Crypto.Cipher import DES
+
+from .errors import CryptosystemError
+from .file_operations import FileChunks
+
+
+# binary CTR data is keyed by 4-byte nonce and 4-byte initial counter of
+# 8-byte blocks, so the keystream of any byte is known from its position
+CTR_NONCE_SIZE = 4
+CTR_COUNTER_SIZE = 4
+# pycryptodome wraps the counter around silently, which would repeat the
+# keystream, so one nonce encrypts at most 2^32 blocks (32 GiB)
+CTR_MAX_BLOCKS = 1 << (8 * CTR_COUNTER_SIZE)
+CTR_MAX_SIZE = CTR_MAX_BLOCKS * DES.block_size
+# files are split between processes by segments of whole blocks
+SEGMENT_SIZE = 8 << 20
+
+
+def pack_ctr_iv(nonce: bytes, counter: int) -> bytes:
+    return nonce + counter.to_bytes(CTR_COUNTER_SIZE, "big")
+
+
+def unpack_ctr_iv(iv: bytes) -> tuple[bytes, int]:
+    # files encrypted before the counter was recorded start from 0
+    if len(iv) == CTR_NONCE_SIZE:
+        return iv, 0
+    if len(iv) != CTR_NONCE_SIZE + CTR_COUNTER_SIZE:
+        raise ValueError("CTR header has wrong length")
+    return iv[:CTR_NONCE_SIZE], int.from_bytes(iv[CTR_NONCE_SIZE:], "big")
+
+
+def new_ctr_cipher(key: bytes, nonce: bytes, counter: int, position: int = 0):
+    # cipher for data from the block which contains byte position
+    return CtrCipher(key, nonce, counter + position // DES.block_size)
+
+
+class CtrCipher:
+    def __init__(self, key: bytes, nonce: bytes, block: int):
+        if block >= CTR_MAX_BLOCKS:
+            raise_ctr_overflow()
+        self.nonce = nonce
+        self.bytes_left = (CTR_MAX_BLOCKS - block) * DES.block_size
+        self.cipher = DES.new(key, DES.MODE_CTR, nonce=nonce, initial_value=block)
+
+    def encrypt(self, data: bytes) -> bytes:
+        self.bytes_left -= len(data)
+        if self.bytes_left < 0:
+            raise_ctr_overflow()
+        return self.cipher.encrypt(data)
+
+    decrypt = encrypt
+
+
+def raise_ctr_overflow():
+    raise CryptosystemError(
+        f"CTR mode can't process more than {CTR_MAX_SIZE >> 30} GiB, as its "
+        f"block counter would wrap around"
+    )
+
+
+class CtrFile:
+    # CTR data of positions from start to end, which is stored in a file
+    # from data_offset, is processed either by one cipher from the first
+    # block or by workers, each of them seeking to its own segment
+    def __init__(
+        self,
+        source: FileChunks,
+        data_offset: int,
+        key: bytes,
+        nonce: bytes,
+        counter: int,
+    ):
+        self.source = source
+        self.data_offset = data_offset
+        self.key = key
+        self.nonce = nonce
+        self.counter = counter
+
+    def process(
+        self, start: int = 0, end: int | None = None, workers: int | None = None
+    ) -> Iterator[bytes]:
+        data_size = self.source.size() - self.data_offset
+        end = data_size if end is None else min(end, data_size)
+        if start >= end:
+            return iter(())
+        if self.counter * DES.block_size + end > CTR_MAX_SIZE:
+            raise_ctr_overflow()
+        if workers is None or workers < 2 or end - start <= SEGMENT_SIZE:
+            return self._process_range(start, end)
+        return self._process_parallel(start, end, workers)
+
+    def _process_range(self, start: int, end: int) -> Iterator[bytes]:
+        cipher = new_ctr_cipher(self.key, self.nonce, self.counter, start)
+        block_start = start - start % DES.block_size
+        skip = start - block_start
+        chunks = self.source.read_range(
+            self.data_offset + block_start, self.data_offset + end
+        )
+        for chunk in chunks:
+            output = cipher.encrypt(chunk)
+            if skip:
+                output, skip = output[skip:], max(skip - len(output), 0)
+            if output:
+                yield output
+
+    def _process_parallel(
+        self, start: int, end: int, workers: int
+    ) -> Iterator[bytes]:
+        # segments are submitted in order and at most two per worker are
+        # kept in memory at once
+        segment_starts = iter(range(start, end, SEGMENT_SIZE))
+        pending = deque()
+        with ProcessPoolExecutor(workers) as executor:
+            while True:
+                while len(pending) < 2 * workers and (
+                    (segment_start := next(segment_starts, None)) is not None
+                ):
+                    pending.append(
+                        executor.submit(
+                            _process_segment,
+                            self.source.file_path,
+                            self.data_offset,
+                            self.key,
+                            self.nonce,
+                            self.counter,
+                            segment_start,
+                            min(segment_start + SEGMENT_SIZE, end),
+                        )
+                    )
+                if not pending:
+                    break
+                yield pending.popleft().result()
+
+
+def _process_segment(
+    file_path: str,
+    data_offset: int,
+    key: bytes,
+    nonce: bytes,
+    counter: int,
+    start: int,
+    end: int,
+) -> bytes:
+    ctr_file = CtrFile(FileChunks(file_path), data_offset, key, nonce, counter)
+    return b"".join(ctr_file._process_range(start, end))
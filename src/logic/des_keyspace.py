@@ -0,0 +1,301 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from hashlib import sha256
+from itertools import product
+from json import dump, load
+from math import prod
+from multiprocessing import Event
+from os import cpu_count, path, remove, replace
+from string import ascii_lowercase, ascii_uppercase, digits, punctuation
+import sys
+from time import perf_counter
+from Crypto.Cipher import DES
+from Crypto.Util.Padding import unpad
+
+
+MASK_CHARSETS = {
+    "l": ascii_lowercase,
+    "u": ascii_uppercase,
+    "d": digits,
+    "s": f" {punctuation}",
+    "a": f"{ascii_lowercase}{ascii_uppercase}{digits} {punctuation}",
+}
+KEY_SIZE = 8
+MIN_BATCH_SIZE = 20_000
+STOP_CHECK_INTERVAL = 1 << 12
+PROGRESS_INTERVAL = 5
+WHITESPACE = str.maketrans("", "", "\n\r\t")
+
+
+def parse_mask(mask: str, charset: str | None) -> list[list[bytes]]:
+    charsets = []
+    symbols = iter(mask)
+    for symbol in symbols:
+        if symbol == "?":
+            name = next(symbols, "")
+            if name == "?":
+                charsets.append("?")
+            elif name == "1" and charset:
+                charsets.append(charset)
+            elif name in MASK_CHARSETS:
+                charsets.append(MASK_CHARSETS[name])
+            else:
+                raise ValueError(f"unknown mask charset '?{name}'")
+        else:
+            charsets.append(symbol)
+    if len(charsets) != KEY_SIZE:
+        raise ValueError(
+            f"mask must describe {KEY_SIZE} symbols (but {len(charsets)} was given)"
+        )
+    return [_get_parity_free_bytes(charset) for charset in charsets]
+
+
+def split_charsets(
+    charsets: list[list[bytes]],
+) -> tuple[list[list[bytes]], list[list[bytes]]]:
+    # keys of one batch share a prefix and differ only in their last symbols
+    suffix_len = 0
+    while (
+        suffix_len < KEY_SIZE
+        and prod(len(charset) for charset in charsets[KEY_SIZE - suffix_len :])
+        < MIN_BATCH_SIZE
+    ):
+        suffix_len += 1
+    return charsets[: KEY_SIZE - suffix_len], charsets[KEY_SIZE - suffix_len :]
+
+
+def _get_parity_free_bytes(charset: str) -> list[bytes]:
+    # DES ignores the lowest bit of every key byte, so symbols that differ
+    # only in it are the same key and only one of them is tried
+    key_bytes = dict()
+    for symbol in charset:
+        encoded = symbol.encode("utf-8")
+        if len(encoded) != 1:
+            raise ValueError(f"key symbol '{symbol}' is not a single byte")
+        key_bytes.setdefault(encoded[0] & 0xFE, encoded)
+    return list(key_bytes.values())
+
+
+class KeyspaceSearch:
+    def __init__(
+        self,
+        charsets: list[list[bytes]],
+        mode: int,
+        ciphertext: bytes,
+        iv: bytes,
+        phrase: str | None,
+        workers: int | None,
+        checkpoint: str | None,
+    ):
+        self.charsets = charsets
+        self.mode = mode
+        self.ciphertext = ciphertext
+        self.iv = iv
+        self.phrase = phrase
+        self.workers = workers or cpu_count() or 1
+        self.checkpoint = checkpoint
+        self.keyspace_size = prod(len(charset) for charset in charsets)
+        prefix_charsets, _ = split_charsets(charsets)
+        self.batches_count = prod(len(charset) for charset in prefix_charsets)
+        self.batch_size = self.keyspace_size // self.batches_count
+
+    def run(self) -> tuple[bytes | None, str, int, float]:
+        # batches are submitted in order, so every batch before next_batch
+        # is searched and the checkpoint only needs to keep this number
+        next_batch = self._load_checkpoint()
+        found_event = Event()
+        completed = set()
+        tested = 0
+        found = None
+        start_time = perf_counter()
+        progress_time = start_time
+        pending = set()
+        batches = iter(range(next_batch, self.batches_count))
+        with ProcessPoolExecutor(
+            self.workers,
+            initializer=_init_worker,
+            initargs=(
+                found_event,
+                self.charsets,
+                self.mode,
+                self.ciphertext,
+                self.iv,
+                self.phrase,
+            ),
+        ) as executor:
+            try:
+                while True:
+                    while len(pending) < 2 * self.workers and (
+                        (batch := next(batches, None)) is not None
+                    ):
+                        pending.add(executor.submit(_search_batch, batch))
+                    if not pending:
+                        break
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        batch, batch_tested, result = future.result()
+                        tested += batch_tested
+                        completed.add(batch)
+                        if result is not None and found is None:
+                            found = result
+                            found_event.set()
+                    while next_batch in completed:
+                        completed.remove(next_batch)
+                        next_batch += 1
+                    if found is not None:
+                        for future in pending:
+                            future.cancel()
+                        break
+                    if perf_counter() - progress_time >= PROGRESS_INTERVAL:
+                        progress_time = perf_counter()
+                        self._save_checkpoint(next_batch)
+                        self._print_progress(
+                            next_batch, tested, progress_time - start_time
+                        )
+            except KeyboardInterrupt:
+                found_event.set()
+                self._save_checkpoint(next_batch)
+                raise
+        if self.checkpoint and path.exists(self.checkpoint):
+            remove(self.checkpoint)
+        key, plaintext = found or (None, "")
+        return key, plaintext, tested, perf_counter() - start_time
+
+    def _print_progress(self, next_batch: int, tested: int, elapsed: float):
+        print(
+            f"Searched {next_batch * self.batch_size}/{self.keyspace_size} "
+            f"keys ({tested / elapsed:.0f} keys/sec)",
+            file=sys.stderr,
+            flush=True,
+        )
+
+    def _get_search_digest(self) -> str:
+        search = repr(
+            (self.charsets, self.mode, self.ciphertext, self.iv, self.phrase)
+        )
+        return sha256(search.encode("utf-8")).hexdigest()
+
+    def _load_checkpoint(self) -> int:
+        if not self.checkpoint or not path.exists(self.checkpoint):
+            return 0
+        with open(self.checkpoint, encoding="utf-8") as f:
+            state = load(f)
+        if state.get("search") != self._get_search_digest():
+            raise ValueError("checkpoint belongs to another search")
+        return state["next_batch"]
+
+    def _save_checkpoint(self, next_batch: int):
+        if not self.checkpoint:
+            return
+        temp_path = f"{self.checkpoint}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            dump(
+                {"search": self._get_search_digest(), "next_batch": next_batch},
+                f,
+            )
+        replace(temp_path, self.checkpoint)
+
+
+_worker = dict()
+
+
+def _init_worker(found_event, charsets, mode, ciphertext, iv, phrase):
+    prefix_charsets, suffix_charsets = split_charsets(charsets)
+    _worker.update(
+        found_event=found_event,
+        prefix_charsets=prefix_charsets,
+        suffix_charsets=suffix_charsets,
+        mode=mode,
+        ciphertext=ciphertext,
+        iv=iv,
+        phrase=phrase,
+        # the printable prefix check is only a guess of texts without a
+        # phrase, texts with one may start with any symbols
+        first_block=(
+            _get_first_block_decryptor(mode, ciphertext, iv)
+            if phrase is None
+            else None
+        ),
+    )
+
+
+def _search_batch(batch: int) -> tuple[int, int, tuple[bytes, str] | None]:
+    found_event = _worker["found_event"]
+    if found_event.is_set():
+        return batch, 0, None
+    prefix = []
+    prefix_index = batch
+    for charset in reversed(_worker["prefix_charsets"]):
+        prefix_index, i = divmod(prefix_index, len(charset))
+        prefix.append(charset[i])
+    batch_prefix = b"".join(reversed(prefix))
+    decrypt_first_block = _worker["first_block"]
+    tested = 0
+    keys = map(
+        b"".join, product([batch_prefix], *_worker["suffix_charsets"])
+    )
+    for key in keys:
+        tested += 1
+        if tested % STOP_CHECK_INTERVAL == 0 and found_event.is_set():
+            break
+        if decrypt_first_block is not None and not _is_plausible_prefix(
+            decrypt_first_block(key)
+        ):
+            continue
+        if (plaintext := _check_key(key)) is not None:
+            return batch, tested, (key, plaintext)
+    return batch, tested, None
+
+
+def _get_first_block_decryptor(mode: int, ciphertext: bytes, iv: bytes):
+    # the first plain text block is checked before a full decryption, it is
+    # computed with a bare ECB cipher where the mode allows it
+    if len(ciphertext) <= DES.block_size:
+        return None
+    block = ciphertext[: DES.block_size]
+    block_int = int.from_bytes(block, "big")
+    iv_int = int.from_bytes(iv or bytes(DES.block_size), "big")
+    if mode == DES.MODE_ECB:
+        return lambda key: DES.new(key, DES.MODE_ECB).decrypt(block)
+    elif mode == DES.MODE_CBC:
+        return lambda key: (
+            int.from_bytes(DES.new(key, DES.MODE_ECB).decrypt(block), "big")
+            ^ iv_int
+        ).to_bytes(DES.block_size, "big")
+    elif mode in (DES.MODE_OFB, DES.MODE_CTR):
+        # keystream starts with the encrypted IV or the zero counter block
+        counter = iv or bytes(DES.block_size)
+        return lambda key: (
+            int.from_bytes(DES.new(key, DES.MODE_ECB).encrypt(counter), "big")
+            ^ block_int
+        ).to_bytes(DES.block_size, "big")
+    return lambda key: DES.new(key, mode, iv).decrypt(block)
+
+
+def _is_plausible_prefix(block: bytes) -> bool:
+    try:
+        prefix = block.decode("utf-8")
+    except UnicodeDecodeError as error:
+        if error.end != len(block) or error.reason != "unexpected end of data":
+            return False
+        prefix = block[: error.start].decode("utf-8")
+    return prefix.translate(WHITESPACE).isprintable()
+
+
+def _check_key(key: bytes) -> str | None:
+    mode = _worker["mode"]
+    if mode == DES.MODE_ECB:
+        cipher = DES.new(key, mode)
+    elif mode == DES.MODE_CTR:
+        cipher = DES.new(key, mode, nonce=b"")
+    else:
+        cipher = DES.new(key, mode, _worker["iv"])
+    plaintext = cipher.decrypt(_worker["ciphertext"])
+    try:
+        if mode in (DES.MODE_ECB, DES.MODE_CBC, DES.MODE_CFB, DES.MODE_OFB):
+            plaintext = unpad(plaintext, DES.block_size)
+        text = plaintext.decode("utf-8")
+    except ValueError:
+        return None
+    if _worker["phrase"] is not None:
+        return text if _worker["phrase"] in text else None
+    return text if text.translate(WHITESPACE).isprintable() else None
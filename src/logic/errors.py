@@ -0,0 +1,4 @@
+class CryptosystemError(Exception):
+    # ciphers raise it on invalid keys or texts instead of exiting, the cli
+    # shows its message to the user
+    pass
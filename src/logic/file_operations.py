@@ -1,43 +1,194 @@
+from hashlib import file_digest, sha256
 from os import path
+import sys
+
+from .errors import CryptosystemError
+from .output_sinks import AtomicFileSink, OutputSink, ENCODING_ERRORS
+
+
+CHUNK_SIZE = 1 << 16
 
 
 def load_text_from_file(file_path):
     if path.exists(file_path):
-        with open(file_path, encoding="utf-8") as f:
+        with open(file_path, encoding="utf-8", newline="") as f:
             return f.read()
-    else:
-        print(f"Sorry, but no '{file_path}' file was found :c")
-        exit(0)
+    raise CryptosystemError(f"Sorry, but no '{file_path}' file was found :c")
+
+
+def get_file_digest(file_path):
+    # digest of the file bytes, which is the digest of its utf-8 text
+    if not path.exists(file_path):
+        raise CryptosystemError(f"Sorry, but no '{file_path}' file was found :c")
+    with open(file_path, "rb") as f:
+        return file_digest(f, sha256).hexdigest()
+
+
+def read_file_chunks(file_path, chunk_size=CHUNK_SIZE):
+    if not path.exists(file_path):
+        raise CryptosystemError(f"Sorry, but no '{file_path}' file was found :c")
+    return FileChunks(file_path, chunk_size)
+
+
+def parse_range(data_range):
+    # "start:end" positions, either of them may be omitted
+    start, separator, end = data_range.partition(":")
+    try:
+        start = int(start) if start else 0
+        end = int(end) if end else None
+    except ValueError:
+        separator = ""
+    if not separator or start < 0 or end is not None and end < start:
+        raise CryptosystemError(
+            f"Range must look like START:END with 0 <= START <= END, "
+            f"but '{data_range}' was given"
+        )
+    return start, end
+
+
+class FileChunks:
+    # binary file read lazily by chunks, ciphers which can start from any
+    # position read only the ranges of it they need
+    def __init__(self, file_path, chunk_size=CHUNK_SIZE, wrap_chunks=None):
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        self.wrap_chunks = wrap_chunks
+
+    def __iter__(self):
+        return self.read_range(0)
+
+    def size(self):
+        return path.getsize(self.file_path)
+
+    def wrapped(self, wrap_chunks):
+        # the same file, which passes every read range through wrap_chunks
+        return type(self)(self.file_path, self.chunk_size, wrap_chunks)
+
+    def read_range(self, start, end=None):
+        chunks = self._read_range(start, end)
+        return self.wrap_chunks(chunks) if self.wrap_chunks else chunks
+
+    def _read_range(self, start, end):
+        with self._open() as f:
+            self._seek(f, start)
+            left = end - start if end is not None else -1
+            while left and (chunk := f.read(self._get_read_size(left))):
+                left -= len(chunk)
+                yield chunk
+
+    def _get_read_size(self, left):
+        return self.chunk_size if left < 0 else min(left, self.chunk_size)
+
+    def _open(self):
+        return open(self.file_path, "rb")
+
+    def _seek(self, f, position):
+        f.seek(position)
+
+
+class TextFileChunks(FileChunks):
+    # positions of text files are symbols, utf-8 can't be seeked to any of
+    # them, so symbols before a range are decoded and skipped
+    def _open(self):
+        return open(self.file_path, encoding="utf-8", newline="")
 
+    def _seek(self, f, position):
+        while position and (skipped := f.read(min(position, self.chunk_size))):
+            position -= len(skipped)
 
-def file_writer_factory(file_path):
+
+def read_text_chunks(file_path, chunk_size=CHUNK_SIZE):
+    if not path.exists(file_path):
+        raise CryptosystemError(f"Sorry, but no '{file_path}' file was found :c")
+    return TextFileChunks(file_path, chunk_size)
+
+
+def read_chunks_range(chunks, start, end=None):
+    # files are read from start, other input is only sliced
+    if isinstance(chunks, FileChunks):
+        return chunks.read_range(start, end)
+    return slice_chunks(chunks, start, end)
+
+
+def slice_chunks(chunks, start, end=None):
+    position = 0
+    for chunk in chunks:
+        chunk_start = position
+        position += len(chunk)
+        if position <= start:
+            continue
+        if end is not None and chunk_start >= end:
+            break
+        chunk_end = None if end is None else end - chunk_start
+        yield chunk[max(start - chunk_start, 0) : chunk_end]
+
+
+def confirm_file_rewrite(file_path):
+    if path.exists(file_path):
+        rewrite_file = input(
+            f"Sorry, but file '{file_path}' already exists.\n"
+            f"Do you want to rewrite it [Y/N]? "
+        )
+        if not rewrite_file.lower() in ["y", "yes", "yeah"]:
+            print("Aborted =/")
+            exit(0)
+
+
+def file_writer_factory(file_path, errors="replace"):
     def write_text_to_file(text):
-        rewrite_file = False
-        unicode_exception_occured = False
-        while True:
-            if not path.exists(file_path) or rewrite_file:
-                with open(file_path, "w", encoding="utf-8") as f:
-                    for letter in text:
-                        try:
-                            f.write(letter)
-                        except UnicodeEncodeError:
-                            unicode_exception_occured = True
-                            f.write("?")
-                print("File was successfully written.")
-                if unicode_exception_occured:
-                    print(
-                        "But due to UnicodeEncodeException symbols wich "
-                        "Python can't encode were replaced by '?', "
-                        "so it might not be properly decoded."
-                    )
-                break
-            else:
-                rewrite_file = input(
-                    f"Sorry, but file '{file_path}' already exists.\n"
-                    f"Do you want to rewrite it [Y/N]? "
-                )
-                if not rewrite_file.lower() in ["y", "yes", "yeah"]:
-                    print("Aborted =/")
-                    exit(0)
+        confirm_file_rewrite(file_path)
+        with AtomicFileSink(file_path, errors=errors) as sink:
+            write_sink_chunks(sink, text)
+        print("File was successfully written.")
+        if sink.replaced:
+            print(
+                f"But due to UnicodeEncodeException {sink.replaced} symbols "
+                f"wich Python can't encode were {ENCODING_ERRORS[errors]}, "
+                f"so it might not be properly decoded."
+            )
 
     return write_text_to_file
+
+
+def binary_file_writer_factory(file_path):
+    def write_chunks_to_file(chunks):
+        confirm_file_rewrite(file_path)
+        with AtomicFileSink(file_path) as sink:
+            sink.write_chunks(chunks)
+        print("File was successfully written.")
+
+    return write_chunks_to_file
+
+
+def stdout_writer_factory(errors="replace"):
+    def write_text_to_stdout(text):
+        sys.stdout.flush()
+        sink = OutputSink(sys.stdout.buffer, sys.stdout.encoding, errors)
+        with sink:
+            write_sink_chunks(sink, text)
+        print()
+        if sink.replaced:
+            print(
+                f"\nDue to UnicodeEncodeException {sink.replaced} symbols "
+                f"wich Python can't encode were {ENCODING_ERRORS[errors]}, "
+                f"so it might not be properly decoded."
+            )
+
+    return write_text_to_stdout
+
+
+def write_chunks_to_stdout(chunks):
+    sys.stdout.flush()
+    with OutputSink(sys.stdout.buffer) as sink:
+        sink.write_chunks(chunks)
+
+
+def write_sink_chunks(sink, chunks):
+    try:
+        sink.write_chunks(chunks)
+    except UnicodeEncodeError as e:
+        print(
+            f"\nSorry, but symbol {e.object[e.start]!r} can't be encoded "
+            f"with {e.encoding} :c"
+        )
+        exit(0)
@@ -0,0 +1,232 @@
+from array import array
+from collections import Counter
+from functools import lru_cache
+from heapq import heappush, heappushpop
+from itertools import count
+from math import log
+from os import path
+from struct import Struct
+
+
+# every language has tables of log probabilities of its symbols, of symbols
+# after one symbol and after two symbols; they are built from the samples by
+# build_all_tables and kept as int8 arrays of SCORE_SCALE-th parts of a nat
+TABLES_PATH = path.join(path.dirname(path.abspath(__file__)), "ngram_tables")
+LANGUAGES = ("en", "ru", "de")
+PUNCTUATION = " .,\n"
+ALPHABETS = {
+    "en": "abcdefghijklmnopqrstuvwxyz" + PUNCTUATION,
+    "ru": "абвгдеёжзийклмнопрстуфхцчшщъыьэюя" + PUNCTUATION,
+    "de": "abcdefghijklmnopqrstuvwxyzäöüß" + PUNCTUATION,
+}
+# file layout: header | alphabet in utf-8 | unigrams[K] | bigrams[K ** 2]
+# | trigrams[K ** 3], where K is alphabet size plus code 0 of other symbols
+MAGIC = b"CSNG"
+TABLES_VERSION = 1
+HEADER = Struct("=4sBH")
+SCORE_SCALE = 10
+MIN_SCORE = -128
+# weight of an n-gram probability against the one of a shorter n-gram
+HIGHER_ORDER_WEIGHT = 0.7
+# candidates are scored by blocks and dropped as soon as their mean score
+# is worse than the one of the worst kept candidate by ABANDON_MARGIN nats
+BLOCK_SIZE = 256
+ABANDON_MARGIN = 1.0
+
+
+class SymbolCodes(dict):
+    # translation table which gives code 0 to symbols out of the alphabet
+    def __missing__(self, symbol):
+        return "\0"
+
+
+class NgramTables:
+    def __init__(self, alphabet: str, unigrams, bigrams, trigrams):
+        self.alphabet = alphabet
+        self.size = len(alphabet) + 1
+        self.codes = SymbolCodes(
+            (ord(symbol), chr(code)) for code, symbol in enumerate(alphabet, 1)
+        )
+        self.unigrams = unigrams
+        self.bigrams = bigrams
+        self.trigrams = trigrams
+
+    def encode(self, text: str) -> bytes:
+        return text.lower().translate(self.codes).encode("latin-1")
+
+    def score(self, text: str, threshold: float = float("-inf")) -> float | None:
+        # mean log probability of text symbols in nats, or None when text
+        # is abandoned as worse than threshold
+        codes = self.encode(text)
+        if not codes:
+            return None
+        size = self.size
+        total = self.unigrams[codes[0]]
+        if len(codes) > 1:
+            total += self.bigrams[codes[0] * size + codes[1]]
+        trigrams = self.trigrams
+        scaled_threshold = (threshold - ABANDON_MARGIN) * SCORE_SCALE
+        for start in range(0, len(codes) - 2, BLOCK_SIZE):
+            block = codes[start : start + BLOCK_SIZE + 2]
+            total += sum(
+                trigrams[(a * size + b) * size + c]
+                for a, b, c in zip(block, block[1:], block[2:])
+            )
+            scored = min(start + BLOCK_SIZE + 2, len(codes))
+            if scored < len(codes) and total < scaled_threshold * scored:
+                return None
+        return total / len(codes) / SCORE_SCALE
+
+    def common_symbols(self, count: int) -> list[str]:
+        # unigram tables keep the order of symbol frequencies
+        codes = sorted(
+            range(1, self.size), key=self.unigrams.__getitem__, reverse=True
+        )
+        return [self.alphabet[code - 1] for code in codes[:count]]
+
+    def save(self, file_path: str):
+        alphabet = self.alphabet.encode("utf-8")
+        with open(file_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, TABLES_VERSION, len(alphabet)))
+            f.write(alphabet)
+            for table in (self.unigrams, self.bigrams, self.trigrams):
+                table.tofile(f)
+
+    @classmethod
+    def load(cls, file_path: str) -> "NgramTables":
+        with open(file_path, "rb") as f:
+            data = f.read()
+        magic, version, alphabet_size = HEADER.unpack_from(data)
+        if magic != MAGIC or version != TABLES_VERSION:
+            raise ValueError(f"'{file_path}' is not an n-gram tables file")
+        start = HEADER.size + alphabet_size
+        alphabet = data[HEADER.size : start].decode("utf-8")
+        size = len(alphabet) + 1
+        tables = []
+        for table_size in (size, size**2, size**3):
+            tables.append(array("b", data[start : start + table_size]))
+            start += table_size
+        if len(tables[-1]) != size**3:
+            raise ValueError(f"'{file_path}' n-gram tables are truncated")
+        return cls(alphabet, *tables)
+
+
+@lru_cache(maxsize=None)
+def load_tables(language: str) -> NgramTables:
+    return NgramTables.load(path.join(TABLES_PATH, f"{language}.bin"))
+
+
+class TopCandidates:
+    # min-heap of the best size candidates, its root is the worst one kept
+    def __init__(self, size: int):
+        self.size = size
+        self.heap = []
+        self.counter = count()
+
+    @property
+    def threshold(self) -> float:
+        if len(self.heap) < self.size:
+            return float("-inf")
+        return self.heap[0][0]
+
+    def push(self, score: float, item):
+        # counter keeps items from being compared on equal scores
+        entry = (score, next(self.counter), item)
+        if len(self.heap) < self.size:
+            heappush(self.heap, entry)
+        elif score > self.heap[0][0]:
+            heappushpop(self.heap, entry)
+
+    def get_sorted(self) -> list[tuple[float, object]]:
+        return [(score, item) for score, _, item in sorted(self.heap, reverse=True)]
+
+
+class NgramScorer:
+    def __init__(self, languages=None):
+        self.languages = tuple(languages or LANGUAGES)
+        self.tables = {language: load_tables(language) for language in self.languages}
+
+    def score(
+        self, text: str, threshold: float = float("-inf")
+    ) -> tuple[float, str] | None:
+        # score of text in its most probable language
+        best = None
+        for language, tables in self.tables.items():
+            score = tables.score(text, threshold)
+            if score is not None and (best is None or score > best[0]):
+                best = (score, language)
+                threshold = score
+        return best
+
+    def rank(self, candidates, top: int) -> list[tuple[float, tuple[str, object]]]:
+        # candidates are (key, text) pairs, the best top of them are returned
+        # as (score, (language, key)) pairs
+        best = TopCandidates(top)
+        for key, text in candidates:
+            scored = self.score(text, best.threshold)
+            if scored is not None:
+                score, language = scored
+                best.push(score, (language, key))
+        return best.get_sorted()
+
+    def common_symbols(self, count: int) -> set[str]:
+        return {
+            symbol
+            for tables in self.tables.values()
+            for symbol in tables.common_symbols(count)
+        }
+
+
+def build_tables(sample: str, alphabet: str) -> NgramTables:
+    tables = NgramTables(alphabet, None, None, None)
+    codes = tables.encode(sample)
+    size = tables.size
+    unigram_counts = Counter(codes)
+    bigram_counts = Counter(zip(codes, codes[1:]))
+    trigram_counts = Counter(zip(codes, codes[1:], codes[2:]))
+    # unigrams are smoothed, so that no probability is zero, and every
+    # higher order is mixed with the lower one, which it falls back to for
+    # unseen contexts
+    unigram_probs = [
+        (unigram_counts[c] + 1) / (len(codes) + size) for c in range(size)
+    ]
+    bigram_probs = [
+        _mix_probs(bigram_counts[b, c], unigram_counts[b], unigram_probs[c])
+        for b in range(size)
+        for c in range(size)
+    ]
+    trigram_probs = [
+        _mix_probs(
+            trigram_counts[a, b, c], bigram_counts[a, b], bigram_probs[b * size + c]
+        )
+        for a in range(size)
+        for b in range(size)
+        for c in range(size)
+    ]
+    tables.unigrams, tables.bigrams, tables.trigrams = (
+        array("b", (max(MIN_SCORE, round(log(p) * SCORE_SCALE)) for p in probs))
+        for probs in (unigram_probs, bigram_probs, trigram_probs)
+    )
+    return tables
+
+
+def _mix_probs(ngram_count: int, context_count: int, lower_prob: float) -> float:
+    if not context_count:
+        return lower_prob
+    return (
+        HIGHER_ORDER_WEIGHT * ngram_count / context_count
+        + (1 - HIGHER_ORDER_WEIGHT) * lower_prob
+    )
+
+
+def build_all_tables():
+    for language in LANGUAGES:
+        sample_path = path.join(TABLES_PATH, "samples", f"{language}.txt")
+        with open(sample_path, encoding="utf-8") as f:
+            sample = f.read()
+        tables = build_tables(sample, ALPHABETS[language])
+        tables.save(path.join(TABLES_PATH, f"{language}.bin"))
+
+
+if __name__ == "__main__":
+    build_all_tables()
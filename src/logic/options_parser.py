@@ -1,4 +1,11 @@
-from .file_operations import load_text_from_file, file_writer_factory
+from .file_operations import (
+    file_writer_factory,
+    read_file_chunks,
+    read_text_chunks,
+    binary_file_writer_factory,
+    stdout_writer_factory,
+    write_chunks_to_stdout,
+)
 
 
 class OptionsParser:
@@ -7,40 +14,52 @@ class OptionsParser:
         self.cipher_method_names = cipher_method_names
 
     def parse_options(self):
-        input_text = self.get_input()
-        file_writer = self.get_output()
+        for name in ("batch", "out_dir", "jobs"):
+            del self.cli_options[name]
         cipher_method_name = self.get_chosen_cipher_method_name()
+        input_text = self.get_input(streamed=cipher_method_name != "bruteforce")
+        file_writer = self.get_output()
         return self.cli_options, input_text, cipher_method_name, file_writer
 
-    def get_input(self):
-        if input_text := self.cli_options["text"]:
-            pass
+    def parse_batch_options(self):
+        cipher_method_name = self.get_chosen_cipher_method_name()
+        batch_options = {
+            name: self.cli_options.pop(name)
+            for name in ("batch", "out_dir", "jobs", "errors")
+        }
+        for name in ("text", "file", "out"):
+            del self.cli_options[name]
+        return self.cli_options, cipher_method_name, batch_options
+
+    def get_input(self, streamed=False):
+        # streamed input is an iterable of chunks, which is read lazily
+        file_path = self.cli_options["file"]
+        if self.cli_options.get("binary"):
+            if input_text := self.cli_options["text"]:
+                input_text = [input_text.encode("utf-8")]
+            else:
+                input_text = read_file_chunks(file_path)
+        elif input_text := self.cli_options["text"]:
+            input_text = [input_text]
         else:
-            input_text = load_text_from_file(self.cli_options["file"])
+            input_text = read_text_chunks(file_path)
+        if not streamed and not self.cli_options.get("binary"):
+            input_text = "".join(input_text)
         del self.cli_options["text"]
         del self.cli_options["file"]
         return input_text
 
     def get_output(self):
-        if out_file_path := self.cli_options["out"]:
-            file_writer = file_writer_factory(out_file_path)
+        errors = self.cli_options.pop("errors")
+        if self.cli_options.get("binary"):
+            if out_file_path := self.cli_options["out"]:
+                file_writer = binary_file_writer_factory(out_file_path)
+            else:
+                file_writer = write_chunks_to_stdout
+        elif out_file_path := self.cli_options["out"]:
+            file_writer = file_writer_factory(out_file_path, errors)
         else:
-
-            def file_writer(text):
-                unicode_exception_occured = False
-                for letter in text:
-                    try:
-                        print(letter, end='')
-                    except UnicodeEncodeError:
-                        unicode_exception_occured = True
-                print()
-                if unicode_exception_occured:
-                    print(
-                        "\nDue to UnicodeEncodeException symbols wich "
-                        "Python can't encode were replaced by '?', "
-                        "so it might not be properly decoded."
-                    )
-
+            file_writer = stdout_writer_factory(errors)
         del self.cli_options["out"]
         return file_writer
 
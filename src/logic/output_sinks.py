@@ -0,0 +1,122 @@
+from codecs import lookup_error, register_error
+from os import chmod, fsync, path, remove, replace, stat, umask
+from tempfile import mkstemp
+from threading import local
+from typing import BinaryIO, Iterable
+
+
+OUTPUT_BUFFER_SIZE = 1 << 20
+ENCODING_ERRORS = {
+    "replace": "replaced by '?'",
+    "ignore": "skipped",
+    "backslashreplace": "replaced by backslash escapes",
+    "xmlcharrefreplace": "replaced by XML character references",
+    "strict": "",
+}
+
+_counters = local()
+
+
+def _get_counting_errors(errors: str) -> str:
+    # unencodable symbols are handled by the codec itself in one pass, the
+    # wrapping handler only counts them
+    name = f"cryptosystem-counting-{errors}"
+    try:
+        lookup_error(name)
+    except LookupError:
+        handle_error = lookup_error(errors)
+
+        def count_error(error):
+            _counters.replaced = getattr(_counters, "replaced", 0) + (
+                error.end - error.start
+            )
+            return handle_error(error)
+
+        register_error(name, count_error)
+    return name
+
+
+class OutputSink:
+    # chunks are encoded and collected in a buffer, which is written to
+    # the stream once it is large enough
+    def __init__(
+        self, stream: BinaryIO, encoding: str = "utf-8", errors: str = "replace"
+    ):
+        self.stream = stream
+        self.encoding = encoding
+        self.errors = errors
+        self.counting_errors = (
+            errors if errors == "strict" else _get_counting_errors(errors)
+        )
+        self.replaced = 0
+        self.buffer = []
+        self.buffer_size = 0
+
+    def write(self, data: str | bytes):
+        if isinstance(data, str):
+            replaced = getattr(_counters, "replaced", 0)
+            data = data.encode(self.encoding, self.counting_errors)
+            self.replaced += getattr(_counters, "replaced", 0) - replaced
+        self.buffer.append(data)
+        self.buffer_size += len(data)
+        if self.buffer_size >= OUTPUT_BUFFER_SIZE:
+            self.flush()
+
+    def write_chunks(self, chunks: Iterable[str | bytes] | str | bytes):
+        if isinstance(chunks, (str, bytes)):
+            chunks = [chunks]
+        for chunk in chunks:
+            self.write(chunk)
+
+    def flush(self):
+        self.stream.write(b"".join(self.buffer))
+        self.buffer = []
+        self.buffer_size = 0
+        self.stream.flush()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+
+
+class AtomicFileSink(OutputSink):
+    # output goes to a temporary file next to the target one, which replaces
+    # the target only when everything was written
+    def __init__(self, file_path: str, encoding="utf-8", errors="replace"):
+        directory = path.dirname(path.abspath(file_path))
+        file_descriptor, self.temp_path = mkstemp(
+            dir=directory, prefix=f".{path.basename(file_path)}.", suffix=".tmp"
+        )
+        super().__init__(open(file_descriptor, "wb"), encoding, errors)
+        self.file_path = file_path
+
+    def close(self):
+        self.flush()
+        fsync(self.stream.fileno())
+        self.stream.close()
+        chmod(self.temp_path, self._get_file_mode())
+        replace(self.temp_path, self.file_path)
+
+    def abort(self):
+        self.stream.close()
+        if path.exists(self.temp_path):
+            remove(self.temp_path)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _get_file_mode(self) -> int:
+        if path.exists(self.file_path):
+            return stat(self.file_path).st_mode & 0o7777
+        current_umask = umask(0)
+        umask(current_umask)
+        return 0o666 & ~current_umask
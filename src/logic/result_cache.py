@@ -0,0 +1,165 @@
+from hashlib import sha256
+from json import dumps
+from os import close, makedirs, path, remove, replace, scandir, utime
+from tempfile import mkstemp
+from typing import Callable
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+# entries are files named by sha256 of what they were computed from and
+# spread over 256 subdirectories; they are written to temporary files and
+# renamed, so readers of other processes never see partial entries, and
+# reading an entry touches its mtime, which eviction orders them by
+CACHE_VERSION = 1
+DEFAULT_MAX_SIZE = 256 << 20
+LOCK_NAME = "lock"
+TEMP_SUFFIX = ".tmp"
+
+active_cache = None
+
+
+def get_active_cache():
+    return active_cache
+
+
+def set_active_cache(cache):
+    global active_cache
+    active_cache = cache
+    return cache
+
+
+def get_cache_key(*parts) -> str:
+    data = dumps([CACHE_VERSION, *parts], sort_keys=True, default=str)
+    return sha256(data.encode("utf-8")).hexdigest()
+
+
+def get_data_digest(data: str | bytes) -> str:
+    if isinstance(data, str):
+        data = data.encode("utf-8", "surrogatepass")
+    return sha256(data).hexdigest()
+
+
+def get_result_key(cipher, method_name: str, options: dict, text) -> str | None:
+    # only results which depend on nothing but options and the whole text
+    # are cached, unlike those of ciphers which read other files
+    if active_cache is None or method_name not in cipher.cached_methods:
+        return None
+    if not isinstance(text, str):
+        return None
+    return get_cache_key(
+        cipher.__name__.lower(), method_name, options, get_data_digest(text)
+    )
+
+
+class ResultCache:
+    def __init__(self, directory: str, max_size: int = DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    def get_path(self, cache_key: str) -> str | None:
+        entry_path = self._get_entry_path(cache_key)
+        try:
+            utime(entry_path)
+        except OSError:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return entry_path
+
+    def store(self, cache_key: str, write: Callable[[str], None]):
+        # the cache is only an optimization, so it is fine not to write it
+        entry_path = self._get_entry_path(cache_key)
+        try:
+            makedirs(path.dirname(entry_path), exist_ok=True)
+            file_descriptor, temp_path = mkstemp(
+                dir=path.dirname(entry_path), suffix=TEMP_SUFFIX
+            )
+            close(file_descriptor)
+            try:
+                write(temp_path)
+                replace(temp_path, entry_path)
+            finally:
+                if path.exists(temp_path):
+                    remove(temp_path)
+        except OSError:
+            return
+        self.stats["writes"] += 1
+        self._evict()
+
+    def load_result(self, cache_key: str) -> str | None:
+        if (entry_path := self.get_path(cache_key)) is None:
+            return None
+        try:
+            with open(entry_path, "rb") as f:
+                return f.read().decode("utf-8", "surrogatepass")
+        except OSError:
+            # evicted by another process right after it was found
+            return None
+
+    def store_result(self, cache_key: str, result: str):
+        data = result.encode("utf-8", "surrogatepass")
+
+        def write(file_path: str):
+            with open(file_path, "wb") as f:
+                f.write(data)
+
+        self.store(cache_key, write)
+
+    def get_report(self) -> dict:
+        entries = self._scan_entries()
+        return {
+            **self.stats,
+            "entries": len(entries),
+            "size_bytes": sum(size for _, size, _ in entries),
+            "max_size_bytes": self.max_size,
+        }
+
+    def _get_entry_path(self, cache_key: str) -> str:
+        return path.join(self.directory, cache_key[:2], cache_key[2:])
+
+    def _evict(self):
+        # processes evict one at a time, so none of them removes entries
+        # which were already made room for by another one
+        try:
+            with open(path.join(self.directory, LOCK_NAME), "ab") as lock:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                entries = self._scan_entries()
+                size = sum(entry_size for _, entry_size, _ in entries)
+                for _, entry_size, entry_path in sorted(entries):
+                    if size <= self.max_size:
+                        break
+                    try:
+                        remove(entry_path)
+                        self.stats["evictions"] += 1
+                    except FileNotFoundError:
+                        pass
+                    size -= entry_size
+        except OSError:
+            pass
+
+    def _scan_entries(self) -> list[tuple[int, int, str]]:
+        entries = []
+        try:
+            subdirs = [entry for entry in scandir(self.directory) if entry.is_dir()]
+        except OSError:
+            return entries
+        for subdir in subdirs:
+            try:
+                subdir_entries = list(scandir(subdir.path))
+            except OSError:
+                continue
+            for entry in subdir_entries:
+                if entry.name.endswith(TEMP_SUFFIX):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        return entries
@@ -0,0 +1,153 @@
+import gc
+import sys
+from contextlib import contextmanager
+from json import dumps
+from time import perf_counter
+from typing import Iterable, Iterator
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+class RunStats:
+    # phase times are exclusive: a phase entered from another one (like
+    # reading input chunks pulled by the cipher) pauses the outer phase
+    def __init__(self):
+        self.start_time = perf_counter()
+        self.phase_times = dict()
+        self.phase_stack = []
+        self.phase_start_time = self.start_time
+        self.counters = dict()
+        self.start_blocks = sys.getallocatedblocks()
+        self.peak_blocks = self.start_blocks
+        self.start_collections = self._get_gc_collections()
+
+    def add_phase_time(self, name: str, seconds: float):
+        self.phase_times[name] = self.phase_times.get(name, 0) + seconds
+
+    @contextmanager
+    def phase(self, name: str):
+        self._switch_phase()
+        self.phase_stack.append(name)
+        try:
+            yield
+        finally:
+            self._switch_phase()
+            self.phase_stack.pop()
+
+    def timed_chunks(self, phase: str, chunks: Iterable, counter: str) -> Iterator:
+        if isinstance(chunks, (str, bytes)):
+            chunks = [chunks]
+        chunks = iter(chunks)
+        while True:
+            with self.phase(phase):
+                chunk = next(chunks, None)
+            if chunk is None:
+                return
+            self.count(counter, chunk)
+            yield chunk
+
+    def count(self, counter: str, chunk: str | bytes):
+        unit = "bytes" if isinstance(chunk, bytes) else "chars"
+        count = self.counters.get(counter, (unit, 0))[1]
+        self.counters[counter] = unit, count + len(chunk)
+
+    def get_report(self) -> dict:
+        self._switch_phase()
+        total_seconds = perf_counter() - self.start_time
+        cipher_seconds = self.phase_times.get("cipher", 0)
+        phase_times = dict(self.phase_times)
+        # time spent outside of any phase, like parsing cli options
+        phase_times["other"] = max(total_seconds - sum(phase_times.values()), 0)
+        report = {
+            "total_seconds": total_seconds,
+            "phases": {
+                name: {
+                    "seconds": seconds,
+                    "share": seconds / max(total_seconds, 1e-9),
+                }
+                for name, seconds in phase_times.items()
+            },
+            "peak_rss_bytes": get_peak_rss(),
+            "allocated_blocks": {
+                "start": self.start_blocks,
+                "end": sys.getallocatedblocks(),
+                "peak": self.peak_blocks,
+            },
+            "gc_collections": self._get_gc_collections() - self.start_collections,
+        }
+        for counter, (unit, count) in self.counters.items():
+            report[counter] = {
+                "unit": unit,
+                "count": count,
+                "per_second": count / max(total_seconds, 1e-9),
+                "per_cipher_second": count / max(cipher_seconds, 1e-9),
+            }
+        return report
+
+    def format_report(self, stats_format: str) -> str:
+        report = self.get_report()
+        if stats_format == "json":
+            return dumps(report, indent=2)
+        lines = ["Stats:"]
+        for name, phase in report["phases"].items():
+            lines.append(
+                f"  {name:<14} {phase['seconds']:>9.4f}s {phase['share']:>7.1%}"
+            )
+        lines.append(f"  {'total':<14} {report['total_seconds']:>9.4f}s")
+        for counter in ("input", "output"):
+            if counter in report:
+                counts = report[counter]
+                lines.append(
+                    f"  {counter}: {counts['count']} {counts['unit']}, "
+                    f"{counts['per_second']:.0f} {counts['unit']}/s overall, "
+                    f"{counts['per_cipher_second']:.0f} {counts['unit']}/s "
+                    f"in cipher"
+                )
+        if report["peak_rss_bytes"] is not None:
+            lines.append(f"  peak RSS: {report['peak_rss_bytes'] / 2**20:.1f} MB")
+        blocks = report["allocated_blocks"]
+        lines.append(
+            f"  allocated blocks: {blocks['start']} at start, "
+            f"{blocks['peak']} at peak, {blocks['end']} at end; "
+            f"gc collections: {report['gc_collections']}"
+        )
+        return "\n".join(lines)
+
+    def _switch_phase(self):
+        now = perf_counter()
+        if self.phase_stack:
+            self.add_phase_time(self.phase_stack[-1], now - self.phase_start_time)
+        self.phase_start_time = now
+        self.peak_blocks = max(self.peak_blocks, sys.getallocatedblocks())
+
+    def _get_gc_collections(self) -> int:
+        return sum(generation["collections"] for generation in gc.get_stats())
+
+
+def get_peak_rss() -> int | None:
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes and macOS bytes
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+@contextmanager
+def profile_to_file(file_path: str | None):
+    if file_path is None:
+        yield
+        return
+    # cProfile is imported only when profiling is asked for
+    from cProfile import Profile
+
+    profiler = Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(file_path)
+        print(f"Profile was written to {file_path}", file=sys.stderr)
@@ -1,2 +1,3 @@
 from .cli import run_cryptosystem_cli
 from .cli import add_cipher_options
+from .cli import add_cipher_command
@@ -1,48 +1,298 @@
-from cloup import group, option_group, option, Path
-from cloup.constraints import require_one, constraint
+from cloup import (
+    Group,
+    group,
+    command,
+    option_group,
+    option,
+    pass_context,
+    pass_obj,
+    Path,
+    Choice,
+)
+from cloup.constraints import (
+    constraint,
+    require_one,
+    require_all,
+    accept_none,
+    If,
+    IsSet,
+)
 
 from functools import reduce
+from json import dumps
+from shlex import split
+import sys
 
-from ..logic import BaseCipher, import_ciphers, OptionsParser
+from ..logic import (
+    CryptosystemError,
+    OptionsParser,
+    import_cipher,
+    load_cipher_registry,
+)
+from ..logic.file_operations import FileChunks
+from ..logic.result_cache import (
+    ResultCache,
+    DEFAULT_MAX_SIZE,
+    get_active_cache,
+    get_result_key,
+    set_active_cache,
+)
+from ..logic.run_stats import RunStats, profile_to_file
 
 
 common_cipher_option_names = ["encrypt", "decrypt", "bruteforce"]
+encrypt_option = option(
+    "-e",
+    "--encrypt",
+    is_flag=True,
+    help="encrypt given text",
+)
+decrypt_option = option(
+    "-d",
+    "--decrypt",
+    is_flag=True,
+    help="decrypt given text",
+)
+cipher_method_options = option_group(
+    "Cipher method options",
+    encrypt_option,
+    decrypt_option,
+    option(
+        "-b",
+        "--bruteforce",
+        is_flag=True,
+        help="bruteforce given encrypted text",
+    ),
+    constraint=require_one,
+)
+input_output_options = [
+    option("-t", "--text", type=str, help="read input data from text"),
+    option("-f", "--file", type=Path(), help="read input data from file"),
+    option("-o", "--out", type=Path(), help="write output to file"),
+]
+errors_option = option(
+    "--errors",
+    type=Choice(
+        ["replace", "ignore", "backslashreplace", "xmlcharrefreplace", "strict"]
+    ),
+    default="replace",
+    show_default=True,
+    help="""
+        how to write symbols which can't be encoded in output, "strict"
+        stops writing at the first such symbol
+    """,
+)
 common_cipher_options = [
+    cipher_method_options,
+    *input_output_options,
     option_group(
-        "Cipher method options",
+        "Batch options",
         option(
-            "-e",
-            "--encrypt",
-            is_flag=True,
-            help="encrypt given text",
+            "--batch",
+            type=str,
+            help="""
+                encrypt or decrypt every file of a directory or matching
+                a glob (like "texts/**/*.txt"), files whose output is newer
+                than them are skipped
+            """,
         ),
         option(
-            "-d",
-            "--decrypt",
-            is_flag=True,
-            help="decrypt given text",
+            "--out-dir",
+            type=Path(file_okay=False),
+            help="directory to write batch output files to",
         ),
         option(
-            "-b",
-            "--bruteforce",
-            is_flag=True,
-            help="bruteforce given encrypted text",
+            "-j",
+            "--jobs",
+            type=int,
+            help="number of batch processes, all CPUs by default",
         ),
-        constraint=require_one,
     ),
-    option("-t", "--text", type=str, help="read input data from text"),
-    option("-f", "--file", type=Path(), help="read input data from file"),
-    option("-o", "--out", type=Path(), help="write output to file"),
-    constraint(require_one, ("text", "file")),
+    errors_option,
+    constraint(require_one, ("text", "file", "batch")),
+    constraint(If("batch", then=require_all), ["out_dir"]),
+    constraint(If("batch", then=accept_none), ["out", "bruteforce"]),
+    constraint(If(~IsSet("batch"), then=accept_none), ["out_dir", "jobs"]),
 ]
 
 
 cipher_sppecific_options = dict()
+cipher_commands = dict()
 
 
-@group()
-def cryptosystem_cli():
-    pass
+class LazyCipherGroup(Group):
+    # cipher modules are imported only when their command is chosen
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cipher_registry = None
+        self.run_stats = RunStats()
+
+    def get_cipher_registry(self):
+        if self.cipher_registry is None:
+            with self.run_stats.phase("load"):
+                self.cipher_registry = load_cipher_registry()
+        return self.cipher_registry
+
+    def list_commands(self, ctx):
+        return sorted({*super().list_commands(ctx), *self.get_cipher_registry()})
+
+    def get_command(self, ctx, cmd_name):
+        cipher_registry = self.get_cipher_registry()
+        if cmd_name not in self.commands and cmd_name in cipher_registry:
+            with self.run_stats.phase("load"):
+                add_cipher_commands(cipher_registry[cmd_name])
+        return super().get_command(ctx, cmd_name)
+
+    def invoke(self, ctx):
+        # ciphers raise errors as any library does, cli users only get
+        # their messages
+        try:
+            return super().invoke(ctx)
+        except CryptosystemError as e:
+            print(e)
+            exit(0)
+
+    def format_commands(self, ctx, formatter):
+        # cipher commands have no help of their own, so it is not needed to
+        # import them just to list their names
+        with formatter.section("Commands"):
+            formatter.write_dl([(name, "") for name in self.list_commands(ctx)])
+
+
+@group(cls=LazyCipherGroup)
+@option(
+    "--stats",
+    is_flag=True,
+    help="""
+        report time of every phase (loading, reading, key parsing, cipher,
+        writing), throughput, peak RSS and allocations to stderr
+    """,
+)
+@option(
+    "--stats-format",
+    type=Choice(["text", "json"]),
+    default="text",
+    show_default=True,
+    help="format of --stats report",
+)
+@option(
+    "--profile",
+    type=Path(dir_okay=False),
+    help="""
+        write cProfile stats of the cipher call to file, which can be read
+        with pstats (in batch mode only the main process is profiled)
+    """,
+)
+@option(
+    "--connect",
+    type=str,
+    metavar="ADDRESS",
+    help="""
+        send cipher commands to a server started with serve command, at its
+        unix socket path or localhost HOST:PORT (key files are read by the
+        server from its --key-dir)
+    """,
+)
+@option(
+    "--cache",
+    type=Path(file_okay=False),
+    envvar="CRYPTOSYSTEM_CACHE",
+    help="""
+        directory to cache bruteforce results and parsed key files in, so
+        that the same job with the same input is not done again (can be
+        set by CRYPTOSYSTEM_CACHE environment variable)
+    """,
+)
+@option(
+    "--cache-size",
+    type=int,
+    default=DEFAULT_MAX_SIZE >> 20,
+    show_default=True,
+    help="size of the cache in MB, least recently used entries are removed",
+)
+@option("--no-cache", is_flag=True, help="don't use the cache even if it is set")
+@option(
+    "--cache-stats",
+    is_flag=True,
+    help="report cache hits, misses, writes, evictions and size to stderr",
+)
+@pass_context
+def cryptosystem_cli(
+    ctx,
+    stats,
+    stats_format,
+    profile,
+    connect,
+    cache,
+    cache_size,
+    no_cache,
+    cache_stats,
+):
+    run_stats = ctx.command.run_stats
+    ctx.obj = {"run_stats": run_stats, "profile": profile, "connect": connect}
+    if stats:
+        # the report is printed even if the cipher stops with an exit
+        ctx.call_on_close(
+            lambda: print(run_stats.format_report(stats_format), file=sys.stderr)
+        )
+    if cache is not None and not no_cache:
+        set_active_cache(ResultCache(cache, cache_size << 20))
+    if cache_stats:
+        ctx.call_on_close(print_cache_stats)
+
+
+def print_cache_stats():
+    if (result_cache := get_active_cache()) is None:
+        print("Cache is not used", file=sys.stderr)
+    else:
+        print(dumps(result_cache.get_report(), indent=2), file=sys.stderr)
+
+
+@cryptosystem_cli.command("serve")
+@option(
+    "-l",
+    "--listen",
+    type=str,
+    required=True,
+    metavar="ADDRESS",
+    help="unix socket path or localhost HOST:PORT to listen on",
+)
+@option(
+    "-j",
+    "--jobs",
+    type=int,
+    help="""
+        number of processes for bruteforce and large requests, all CPUs by
+        default
+    """,
+)
+@option(
+    "-k",
+    "--key-dir",
+    type=Path(exists=True, file_okay=False),
+    help="""
+        directory which key files, key indexes and corpora of requests are
+        read from, requests can't name any other files without it
+    """,
+)
+def serve(listen, jobs, key_dir):
+    # asyncio and the process pool are imported only for the server
+    from ..logic.cipher_server import CipherServer
+
+    server = CipherServer(listen, jobs, key_dir)
+    server.run()
+    print(dumps(server.stats.get_report(), indent=2), file=sys.stderr)
+
+
+@cryptosystem_cli.command("server-stats")
+@pass_obj
+def server_stats(run_options):
+    if run_options["connect"] is None:
+        raise CryptosystemError("Server address must be given with --connect")
+    from ..logic.cipher_client import request_server
+
+    response = request_server(run_options["connect"], {"method": "stats"})
+    print(dumps(response["stats"], indent=2))
 
 
 def apply_decorators(func, decorators):
@@ -56,35 +306,260 @@ def add_cipher_options(cipher_class, *options):
     cipher_sppecific_options[cipher_class.__name__.lower()] = options
 
 
+def add_cipher_command(cipher_class, command_name, func, *options):
+    cipher_commands.setdefault(cipher_class.__name__.lower(), []).append(
+        (command_name, func, options)
+    )
+
+
 def run_cryptosystem_cli():
-    import_ciphers()
-    for cipher in BaseCipher.__subclasses__():
-        cipher_name = cipher.__name__.lower()
-        cipher_func = cipher_func_factory(cipher)
-        globals()[cipher_name] = cipher_func
+    cryptosystem_cli()
+
+
+def add_cipher_commands(registry_entry):
+    cipher = import_cipher(registry_entry)
+    cipher_name = cipher.__name__.lower()
+    cipher_func = cipher_func_factory(cipher)
+    globals()[cipher_name] = cipher_func
+    decorators = (
+        cryptosystem_cli.command(cipher_name),
+        *common_cipher_options,
+        *cipher_sppecific_options.get(cipher_name, [lambda func: func]),
+    )
+    apply_decorators(cipher_func, decorators)
+    for command_name, func, options in cipher_commands.get(cipher_name, []):
         decorators = (
-            cryptosystem_cli.command(cipher_name),
-            *common_cipher_options,
-            *cipher_sppecific_options.get(cipher_name, [lambda func: func]),
+            cryptosystem_cli.command(f"{cipher_name}-{command_name}"),
+            *options,
         )
-        apply_decorators(cipher_func, decorators)
-    cryptosystem_cli()
+        apply_decorators(func, decorators)
 
 
 def cipher_func_factory(cipher):
-    def cipher_func(**cli_options):
+    @pass_obj
+    def cipher_func(run_options, **cli_options):
+        run_stats = run_options["run_stats"]
+        options_parser = OptionsParser(cli_options, common_cipher_option_names)
+        if cli_options["batch"] is not None and run_options["connect"]:
+            raise CryptosystemError("Batch mode can't be used with --connect")
+        if cli_options["batch"] is not None:
+            # process pool is imported only for batches
+            from ..logic.batch import BatchRun
+
+            (
+                cli_options,
+                cipher_method_name,
+                batch_options,
+            ) = options_parser.parse_batch_options()
+            batch_run = BatchRun(
+                cipher,
+                cipher_method_name,
+                cli_options,
+                batch_options["batch"],
+                batch_options["out_dir"],
+                batch_options["jobs"],
+                batch_options["errors"],
+            )
+            with run_stats.phase("batch"), profile_to_file(run_options["profile"]):
+                print(batch_run.run())
+            return
+        with run_stats.phase("read"):
+            (
+                cli_options,
+                input_text,
+                cipher_method_name,
+                file_writer,
+            ) = options_parser.parse_options()
+        if run_options["connect"] is not None:
+            with run_stats.phase("cipher"):
+                cipher_result = request_cipher_server(
+                    run_options["connect"],
+                    cipher,
+                    cipher_method_name,
+                    cli_options,
+                    input_text,
+                )
+            with run_stats.phase("write"):
+                file_writer(cipher_result)
+            return
+        # streamed ciphers do their work while output is written, so the
+        # profile covers everything from key parsing to the written output
+        with profile_to_file(run_options["profile"]):
+            if cipher_method_name == "bruteforce":
+                run_stats.count("input", input_text)
+                cipher_result = None
+                result_key = get_result_key(
+                    cipher, cipher_method_name, cli_options, input_text
+                )
+                if result_key is not None:
+                    with run_stats.phase("cache"):
+                        cipher_result = get_active_cache().load_result(result_key)
+                if cipher_result is None:
+                    with run_stats.phase("key"):
+                        cipher_instance = cipher(input_text, **cli_options)
+                    with run_stats.phase("cipher"):
+                        cipher_result = cipher_instance.bruteforce()
+                    if result_key is not None:
+                        with run_stats.phase("cache"):
+                            get_active_cache().store_result(result_key, cipher_result)
+                run_stats.count("output", cipher_result)
+            else:
+                # encryption and decryption stream input by chunks
+                with run_stats.phase("key"):
+                    cipher_method = getattr(
+                        cipher(None, **cli_options),
+                        f"{cipher_method_name}_chunks",
+                    )
+                input_text = timed_input(run_stats, input_text)
+                cipher_result = run_stats.timed_chunks(
+                    "cipher", cipher_method(input_text), "output"
+                )
+            with run_stats.phase("write"):
+                file_writer(cipher_result)
+
+    return cipher_func
+
+
+def timed_input(run_stats, input_text):
+    # ciphers which seek in input files read their ranges by themselves
+    if isinstance(input_text, FileChunks):
+        return input_text.wrapped(
+            lambda chunks: run_stats.timed_chunks("read", chunks, "input")
+        )
+    return run_stats.timed_chunks("read", input_text, "input")
+
+
+def request_cipher_server(address, cipher, cipher_method_name, cli_options, text):
+    # the server does the work, the cli only reads and writes
+    from ..logic.cipher_client import request_server
+
+    if cli_options.get("binary"):
+        raise CryptosystemError("Binary mode can't be used with --connect")
+    response = request_server(
+        address,
+        {
+            "cipher": cipher.__name__.lower(),
+            "method": cipher_method_name,
+            "options": cli_options,
+            "texts": ["".join(text)],
+        },
+    )
+    return response["results"][0]
+
+
+def chain(ctx, stages, **cli_options):
+    # stages pass chunks to each other in this process, so the chain only
+    # reads its input and writes its output
+    from ..logic.cipher_chain import CipherChain
+
+    run_options = ctx.obj
+    run_stats = run_options["run_stats"]
+    options_parser = OptionsParser(cli_options, ["encrypt", "decrypt"])
+    cipher_method_name = options_parser.get_chosen_cipher_method_name()
+    decrypt = cipher_method_name == "decrypt"
+    with run_stats.phase("key"):
+        cipher_chain = CipherChain(
+            [
+                parse_chain_stage(ctx, stage_num, stage, cipher_method_name)
+                for stage_num, stage in enumerate(stages, 1)
+            ]
+        )
+    input_binary, output_binary = cipher_chain.get_binary_ends(decrypt)
+    with run_stats.phase("read"):
+        cli_options["binary"] = input_binary
+        input_text = options_parser.get_input(streamed=True)
+        cli_options["binary"] = output_binary
+        file_writer = options_parser.get_output()
+    with profile_to_file(run_options["profile"]):
+        cipher_result = cipher_chain.process_chunks(
+            timed_input(run_stats, input_text),
+            decrypt,
+            lambda name, chunks: run_stats.timed_chunks(name, chunks, name),
+        )
+        with run_stats.phase("write"):
+            file_writer(cipher_result)
+    stage_names = [name for name, _ in cipher_chain.stages]
+    if decrypt:
+        stage_names.reverse()
+    print(format_chain_report(run_stats, stage_names), file=sys.stderr)
+
+
+def parse_chain_stage(ctx, stage_num, stage, cipher_method_name):
+    # stage options are parsed by the options of its cipher command, so
+    # they are checked by the same types and constraints
+    cipher_name, *stage_args = split(stage) or [""]
+    entry = ctx.find_root().command.get_cipher_registry().get(cipher_name)
+    # commands like book-compile-key are not ciphers
+    if entry is None or entry["class"].lower() != cipher_name:
+        raise CryptosystemError(f"There is no '{cipher_name}' cipher")
+    cipher = import_cipher(entry)
+
+    def stage_options(**cli_options):
+        return cli_options
+
+    stage_command = apply_decorators(
+        stage_options,
         (
-            cli_options,
-            input_text,
-            cipher_method_name,
-            file_writer,
-        ) = OptionsParser(
-            cli_options, common_cipher_option_names
-        ).parse_options()
-        cipher_method = getattr(
-            cipher(input_text, **cli_options),
-            cipher_method_name,
+            command(cipher_name),
+            cipher_method_options,
+            *cipher_sppecific_options.get(cipher_name, [lambda func: func]),
+        ),
+    )
+    stage_ctx = stage_command.make_context(
+        f"--stage {cipher_name}",
+        [f"--{cipher_method_name}", *stage_args],
+        parent=ctx,
+    )
+    cli_options = stage_ctx.params
+    options_parser = OptionsParser(cli_options, common_cipher_option_names)
+    options_parser.get_chosen_cipher_method_name()
+    return f"{stage_num}:{cipher_name}", cipher(None, **cli_options)
+
+
+apply_decorators(
+    chain,
+    (
+        cryptosystem_cli.command("chain"),
+        option_group(
+            "Cipher method options",
+            encrypt_option,
+            decrypt_option,
+            constraint=require_one,
+        ),
+        option(
+            "-s",
+            "--stage",
+            "stages",
+            type=str,
+            multiple=True,
+            required=True,
+            metavar='"CIPHER OPTIONS"',
+            help="""
+                cipher and its options, like "xor -k secret", in the order of
+                encryption; stages are decrypted from the last one, and text
+                stages can't follow binary ones
+            """,
+        ),
+        *input_output_options,
+        errors_option,
+        constraint(require_one, ("text", "file")),
+        pass_context,
+    ),
+)
+
+
+def format_chain_report(run_stats, stage_names):
+    report = run_stats.get_report()
+    lines = ["Stages:"]
+    input_counter = "input"
+    for name in stage_names:
+        seconds = report["phases"].get(name, {"seconds": 0})["seconds"]
+        unit, input_count = run_stats.counters.get(input_counter, ("chars", 0))
+        output_unit, output_count = run_stats.counters.get(name, (unit, 0))
+        lines.append(
+            f"  {name:<14} {seconds:>9.4f}s {input_count} {unit} in, "
+            f"{output_count} {output_unit} out, "
+            f"{input_count / max(seconds, 1e-9):.0f} {unit}/s"
         )
-        cipher_result = cipher_method()
-        file_writer(cipher_result)
-    return cipher_func
+        input_counter = name
+    return "\n".join(lines)
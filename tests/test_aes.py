@@ -0,0 +1,30 @@
+import pytest
+
+from src.logic import CryptosystemError
+from src.logic.ciphers.aes import Aes
+
+
+KEY = "0123456789abcdef"
+
+
+def split_chunks(data: bytes, size: int = 1000) -> list[bytes]:
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+def test_changed_gcm_data_is_not_output():
+    aes = Aes(key=KEY, mode="gcm", binary=True)
+    data = bytes(range(256)) * 100
+    encrypted = bytearray(b"".join(aes.encrypt_chunks(split_chunks(data))))
+    encrypted[len(encrypted) // 2] ^= 1
+    output = []
+    with pytest.raises(CryptosystemError, match="was changed"):
+        for chunk in aes.decrypt_chunks(split_chunks(bytes(encrypted))):
+            output.append(chunk)
+    assert output == []
+
+
+def test_gcm_data_is_decrypted_after_check():
+    aes = Aes(key=KEY, mode="gcm", binary=True)
+    data = bytes(range(256)) * 100
+    encrypted = b"".join(aes.encrypt_chunks(split_chunks(data)))
+    assert b"".join(aes.decrypt_chunks(split_chunks(encrypted))) == data
@@ -0,0 +1,54 @@
+import pytest
+
+from src.logic import CryptosystemError
+from src.logic.cipher_chain import CipherChain
+from src.logic.ciphers.caesar import Caesar
+from src.logic.ciphers.des import Des
+from src.logic.ciphers.xor import XOR
+
+
+# "a" is shifted to the first surrogate code point
+SURROGATE_SHIFT = 0xD800 - ord("a")
+TEXT = "a quick brown fox\n" * 1000
+
+
+def process_text(cipher_chain, text, decrypt=False):
+    chunks = [text[i : i + 100] for i in range(0, len(text), 100)]
+    result = list(cipher_chain.process_chunks(chunks, decrypt))
+    return result[0][:0].join(result)
+
+
+def test_surrogates_of_text_stage_pass_to_binary_stage():
+    cipher_chain = CipherChain(
+        [
+            ("1:caesar", Caesar(shift=SURROGATE_SHIFT)),
+            ("2:xor", XOR(key="secret")),
+            ("3:des", Des(key="12345678", mode="cbc", binary=True)),
+        ]
+    )
+    encrypted = process_text(cipher_chain, TEXT)
+    assert isinstance(encrypted, bytes)
+    chunks = [encrypted[i : i + 7] for i in range(0, len(encrypted), 7)]
+    decrypted = "".join(cipher_chain.process_chunks(chunks, decrypt=True))
+    assert decrypted == TEXT
+
+
+def test_surrogates_before_text_des_stage_are_reported():
+    cipher_chain = CipherChain(
+        [
+            ("1:caesar", Caesar(shift=SURROGATE_SHIFT)),
+            ("2:des", Des(key="12345678", mode="cbc")),
+        ]
+    )
+    with pytest.raises(CryptosystemError, match="2:des can't encode"):
+        process_text(cipher_chain, TEXT)
+
+
+def test_text_stage_cannot_follow_binary_stage():
+    with pytest.raises(CryptosystemError, match="can't follow binary stage"):
+        CipherChain(
+            [
+                ("1:des", Des(key="12345678", mode="cbc", binary=True)),
+                ("2:caesar", Caesar(shift=3)),
+            ]
+        )
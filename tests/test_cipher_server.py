@@ -0,0 +1,68 @@
+import asyncio
+from json import dumps
+
+import pytest
+
+from src.logic import CryptosystemError
+from src.logic.cipher_server import CipherServer, resolve_path_options
+
+
+@pytest.fixture
+def key_dir(tmp_path):
+    (tmp_path / "keys").mkdir()
+    (tmp_path / "keys" / "key.txt").write_text("a key", encoding="utf-8")
+    (tmp_path / "secret.txt").write_text("a secret", encoding="utf-8")
+    return tmp_path / "keys"
+
+
+def request_server(server, request):
+    line = dumps(request).encode("utf-8")
+    return asyncio.run(server.handle_request(line))
+
+
+def test_key_file_outside_key_dir_is_refused(key_dir):
+    server = CipherServer("unused.sock", 1, str(key_dir))
+    for file_path in ("../secret.txt", str(key_dir.parent / "secret.txt")):
+        response = request_server(
+            server,
+            {
+                "cipher": "trithemius",
+                "method": "encrypt",
+                "options": {"key_from_file": file_path},
+                "texts": ["aaaa"],
+            },
+        )
+        assert "key directory" in response["error"]
+
+
+def test_key_files_are_refused_without_key_dir(key_dir):
+    server = CipherServer("unused.sock", 1)
+    response = request_server(
+        server,
+        {
+            "cipher": "trithemius",
+            "method": "encrypt",
+            "options": {"key_from_file": str(key_dir / "key.txt")},
+            "texts": ["aaaa"],
+        },
+    )
+    assert "--key-dir" in response["error"]
+
+
+def test_written_files_are_refused(key_dir):
+    with pytest.raises(CryptosystemError, match="checkpoint"):
+        resolve_path_options({"checkpoint": "progress.json"}, str(key_dir))
+
+
+def test_key_file_in_key_dir_is_read(key_dir):
+    server = CipherServer("unused.sock", 1, str(key_dir))
+    response = request_server(
+        server,
+        {
+            "cipher": "trithemius",
+            "method": "encrypt",
+            "options": {"key_from_file": "key.txt"},
+            "texts": ["aaaa"],
+        },
+    )
+    assert "results" in response
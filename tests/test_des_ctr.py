@@ -0,0 +1,46 @@
+import pytest
+from Crypto.Cipher import DES
+
+from src.logic import CryptosystemError
+from src.logic.des_ctr import (
+    CTR_MAX_BLOCKS,
+    CTR_MAX_SIZE,
+    CtrFile,
+    new_ctr_cipher,
+)
+from src.logic.file_operations import FileChunks
+
+
+KEY = b"bexy1234"
+NONCE = b"none"
+
+
+def test_last_counter_block_is_encrypted():
+    cipher = new_ctr_cipher(KEY, NONCE, CTR_MAX_BLOCKS - 1)
+    expected_cipher = DES.new(
+        KEY, DES.MODE_CTR, nonce=NONCE, initial_value=CTR_MAX_BLOCKS - 1
+    )
+    assert cipher.encrypt(bytes(8)) == expected_cipher.encrypt(bytes(8))
+
+
+def test_counter_does_not_wrap_around():
+    cipher = new_ctr_cipher(KEY, NONCE, CTR_MAX_BLOCKS - 1)
+    cipher.encrypt(bytes(5))
+    cipher.encrypt(bytes(3))
+    with pytest.raises(CryptosystemError, match="wrap around"):
+        cipher.encrypt(bytes(1))
+
+
+def test_position_past_counter_limit_is_refused():
+    with pytest.raises(CryptosystemError, match="wrap around"):
+        new_ctr_cipher(KEY, NONCE, 0, CTR_MAX_SIZE)
+
+
+def test_file_range_past_counter_limit_is_refused(tmp_path):
+    file_path = tmp_path / "data.bin"
+    file_path.write_bytes(bytes(24))
+    ctr_file = CtrFile(FileChunks(str(file_path)), 0, KEY, NONCE, CTR_MAX_BLOCKS - 3)
+    assert len(b"".join(ctr_file.process())) == 24
+    ctr_file = CtrFile(FileChunks(str(file_path)), 0, KEY, NONCE, CTR_MAX_BLOCKS - 2)
+    with pytest.raises(CryptosystemError, match="wrap around"):
+        ctr_file.process()
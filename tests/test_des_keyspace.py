@@ -0,0 +1,18 @@
+from Crypto.Cipher import DES
+from Crypto.Util.Padding import pad
+
+from src.logic.des_keyspace import KeyspaceSearch, parse_mask
+
+
+def test_phrase_is_found_after_unprintable_prefix():
+    plaintext = "\x1b[0mhello secret world here".encode("utf-8")
+    iv = bytes(DES.block_size)
+    ciphertext = DES.new(b"passw012", DES.MODE_CBC, iv).encrypt(
+        pad(plaintext, DES.block_size)
+    )
+    search = KeyspaceSearch(
+        parse_mask("passw?d?d?d", None), DES.MODE_CBC, ciphertext, iv, "secret", 1, None
+    )
+    key, text, _, _ = search.run()
+    assert key is not None
+    assert text == plaintext.decode("utf-8")
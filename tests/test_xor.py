@@ -0,0 +1,24 @@
+import pytest
+
+from src.logic import CryptosystemError
+from src.logic.ciphers.xor import XOR
+
+
+def test_whitespace_text_is_encrypted_with_seed():
+    assert XOR(seed=5).encrypt_text("   ") == ""
+
+
+def test_empty_chunks_are_encrypted_with_seed():
+    chunks = ["", "hello", "", " world"]
+    encrypted = "".join(XOR(seed=5).encrypt_chunks(chunks))
+    assert encrypted == XOR(seed=5).encrypt_text("hello world")
+
+
+def test_surrogate_key_is_used_in_text_mode():
+    xor = XOR(key="k\udcff")
+    assert xor.decrypt_text(xor.encrypt_text("hello")) == "hello"
+
+
+def test_surrogate_key_is_refused_in_binary_mode():
+    with pytest.raises(CryptosystemError, match="can't be encoded"):
+        XOR(key="k\udcff", binary=True)